@@ -1,43 +1,622 @@
+import asyncio
 import logging
 import numpy as np
 import os
-from openai import OpenAI
+import re
+import shutil
+import threading
+import time
+from openai import AsyncOpenAI, OpenAI
+
+from ann_index import select_top_k
+from bm25_index import reciprocal_rank_fusion, tokenize
+from quantization import QuantizedMatrix
+from instrumentation import metrics
+from embedding_persistence import (
+    PersistedSegment, SegmentedMatrix, manifest_lock, manifest_mtime, read_manifest,
+    write_manifest, write_segment,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG)
 
 # Instantiate the OpenAI client with the API key fetched from an environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+DEFAULT_NAMESPACE = "default"
+NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")  # Namespaces double as directory names
+RETRIEVAL_MODES = ("vector", "keyword", "hybrid", "auto")
+
+
+def estimate_tokens(text):
+    """
+    Cheap, deliberately pessimistic token estimate (about three characters per token).
+    """
+    return len(text) // 3 + 1
+
+
+def pack_batches(texts, max_batch_size, max_batch_tokens):
+    """
+    Split `texts` into consecutive batches of indices bounded by item count and estimated tokens.
+    A single text larger than the token budget still gets a batch of its own.
+    """
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_batch_size or current_tokens + tokens > max_batch_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: refills `rate` tokens per second up to `capacity`, and `acquire`
+    waits until the requested amount is available. Used to stay under API rate limits.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket instead of forever
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def grow_rows(array, used, required, initial_capacity):
+    """
+    Return `array`, or a copy with its first `used` rows and room for at least `required`
+    rows (capacity doubles), so appends stay amortised O(1).
+    """
+    if required <= len(array):
+        return array
+    capacity = max(len(array), initial_capacity)
+    while capacity < required:
+        capacity *= 2
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+class EmbeddingCollection:
+    """
+    One namespace's rows: embeddings kept L2-normalised in a single preallocated float32
+    matrix (rows parallel to the ID array and text list), so a query is one matrix-vector
+    product followed by a partial top-k selection. An optional approximate index
+    (e.g. `ann_index.IVFIndex`) is kept in sync as rows are added and can answer queries
+    instead of the exact scan.
+
+    A collection can be saved to and loaded from a directory of append-only, memory-mapped
+    segments (see `embedding_persistence`). Row positions run over the loaded segments
+    first and then over the live in-memory buffer of rows that have not been saved yet.
+
+    With a `codec` (see `quantization`), every row is also stored as a compact code once
+    `codec_train_size` rows have arrived to train it, and searches score the codes instead
+    of the float matrix. `rerank` > 0 re-scores `top_k * rerank` code-ranked candidates at
+    full precision; without re-ranking or a save directory, float rows are dropped from
+    memory after training so only the codes remain.
+
+    With a `keyword_index` (see `bm25_index`), every row's text is also indexed for BM25
+    keyword search, which can be used alone or fused with the vector ranking.
+    """
+
+    def __init__(self, initial_capacity=1024, index=None, codec=None, codec_train_size=4096, rerank=0,
+                 keep_vectors=False, keyword_index=None):
+        self.initial_capacity = initial_capacity  # Rows allocated on the first insert
+        self.embeddings = None  # (capacity, dimension) float32 matrix of live rows, allocated lazily
+        self.ids = np.empty(0, dtype=np.int64)  # Live row -> unique ID
+        self.texts = []  # Live row -> original text segment
+        self.segments = []  # Read-only persisted segments, in manifest order
+        self.frozen_size = 0  # Number of rows held by the persisted segments
+        self.size = 0  # Total number of rows (persisted + live)
+        self.directory = None  # Directory this collection saves to and refreshes from
+        self._manifest_mtime = None  # Manifest version last attached, to make refresh() cheap
+        self._dimension = None
+        self.current_id = 0  # Tracks the next ID to assign
+        self.index = index  # Optional approximate nearest-neighbour index over row positions
+        self.codec = codec  # Optional vector codec (ScalarQuantizer / ProductQuantizer)
+        self.codec_train_size = codec_train_size  # Rows collected before the codec is trained
+        self.codes = None  # (capacity, code size) codes for every row position, once trained
+        self.rerank = rerank  # Candidates per result re-scored at full precision; 0 disables
+        self.keep_vectors = codec is None or keep_vectors or rerank > 0  # Keep float rows after training
+        self.keyword_index = keyword_index  # Optional BM25 index over row texts
+        self.lock = threading.RLock()  # Guards the rows while ingestion and searches run concurrently
+        self.last_access = time.monotonic()  # For TTL-based eviction by the owning EmbeddingStorage
+
+    @property
+    def dimension(self):
+        if self.segments:
+            return self.segments[0].vectors.shape[1]
+        return self._dimension
+
+    @property
+    def quantized(self):
+        return self.codec is not None and self.codec.is_trained
+
+    @property
+    def memory_bytes(self):
+        """
+        Bytes of vector data held in process memory (memory-mapped segments excluded).
+        """
+        live = self.size - self.frozen_size
+        total = self.ids[:live].nbytes
+        if self.embeddings is not None:
+            total += self.embeddings[:live].nbytes
+        if self.codes is not None:
+            total += self.codes[: self.size].nbytes
+        return total
+
+    @property
+    def id_to_text(self):
+        """
+        Mapping of unique IDs to original text segments, built from the row arrays.
+        """
+        return {self._id_at(pos): self._text_at(pos) for pos in range(self.size)}
+
+    def _locate(self, position):
+        """
+        Map a global row position to (segment or None for the live buffer, row within it).
+        """
+        if position >= self.frozen_size:
+            return None, position - self.frozen_size
+        for segment in self.segments:
+            if position < len(segment):
+                return segment, position
+            position -= len(segment)
+        raise IndexError("Row position out of range.")
+
+    def _text_at(self, position):
+        segment, row = self._locate(position)
+        return self.texts[row] if segment is None else segment.text_at(row)
+
+    def _id_at(self, position):
+        segment, row = self._locate(position)
+        return int(self.ids[row] if segment is None else segment.ids[row])
+
+    def _float_matrix(self):
+        """
+        All float rows as one matrix-like object: the live buffer itself when nothing is persisted,
+        otherwise a stitched view over the memory-mapped segments and the live buffer.
+        """
+        live = self.embeddings[: self.size - self.frozen_size] if self.embeddings is not None else None
+        if not self.segments:
+            return live
+        return SegmentedMatrix([segment.vectors for segment in self.segments] + ([live] if live is not None else []))
+
+    def _matrix(self):
+        """
+        The matrix searches score against: the codes once the codec is trained, else the float rows.
+        """
+        if self.quantized:
+            return QuantizedMatrix(self.codec, self.codes[: self.size])
+        return self._float_matrix()
+
+    def _encode_rows(self, first):
+        """
+        Encode float rows from position `first` onwards into the code array.
+        """
+        floats = self._float_matrix()
+        shape, dtype = self.codec.code_shape(self.dimension)
+        if self.codes is None:
+            self.codes = np.zeros((0,) + shape, dtype=dtype)
+        self.codes = grow_rows(self.codes, first, self.size, self.initial_capacity)
+        for start in range(first, self.size, self.initial_capacity):
+            stop = min(start + self.initial_capacity, self.size)
+            self.codes[start:stop] = self.codec.encode(floats[np.arange(start, stop)])
+
+    def _train_codec(self):
+        """
+        Train the codec on every row collected so far and encode them; drop in-memory float
+        rows afterwards unless they are still needed for re-ranking or saving.
+        """
+        floats = self._float_matrix()
+        self.codec.train(floats[np.arange(self.size)])
+        self._encode_rows(0)
+        if not self.keep_vectors:
+            self.embeddings = None
+        logging.info("Quantized %d rows with %s.", self.size, type(self.codec).__name__)
+
+    def add_embedding(self, text, embedding):
+        """
+        Append a single embedding and its text to the matrix, returning the assigned ID.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            logging.warning("Refusing to store a zero vector for text: '%s'", text[:30])
+            return None
+        vector = vector / norm
+        with self.lock:
+            if self.dimension is not None and vector.shape[0] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension {vector.shape[0]} does not match stored dimension {self.dimension}."
+                )
+            self._dimension = vector.shape[0]
+            row = self.size - self.frozen_size
+            self.ids = grow_rows(self.ids, row, row + 1, self.initial_capacity)
+            if self.keep_vectors or not self.quantized:
+                if self.embeddings is None:
+                    self.embeddings = np.zeros((0, vector.shape[0]), dtype=np.float32)
+                self.embeddings = grow_rows(self.embeddings, row, row + 1, self.initial_capacity)
+                self.embeddings[row] = vector
+            self.ids[row] = self.current_id
+            self.texts.append(text)
+            self.size += 1
+            if self.keyword_index is not None:
+                self.keyword_index.add(self.size - 1, text)
+            if self.quantized:
+                self.codes = grow_rows(self.codes, self.size - 1, self.size, self.initial_capacity)
+                self.codes[self.size - 1] = self.codec.encode(vector[None])[0]
+            elif self.codec is not None and self.size >= self.codec_train_size:
+                self._train_codec()
+            if self.index is not None:
+                self.index.add(self.size - 1, self._matrix())
+            self.current_id += 1  # Increment the ID for the next entry
+            return self.current_id - 1
+
+    def nearest(self, query_embedding, top_k, approximate=None):
+        """
+        Return the row positions and cosine similarities of the `top_k` rows closest to the query,
+        best first. Uses the approximate index when one is configured, unless `approximate` is False.
+        Callers hold `lock` while they also resolve the positions to texts or IDs.
+        """
+        if self.directory is not None:
+            self.refresh()  # Pick up segments saved by other worker processes
+        if self.size == 0 or top_k <= 0:
+            return select_top_k(np.empty(0, dtype=np.float32), top_k)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        if approximate is None:
+            approximate = self.index is not None
+        rerank = self.quantized and self.rerank > 0
+        fetch = top_k * self.rerank if rerank else top_k
+        if approximate:
+            if self.index is None:
+                raise ValueError("Approximate search requested but no index is configured.")
+            positions, scores = self.index.search(query, self._matrix(), fetch)
+        else:
+            scores = self._matrix() @ query  # Rows are unit length, so this is cosine similarity
+            positions, scores = select_top_k(scores, fetch)
+        if rerank and len(positions):
+            # Re-score the code-ranked candidates against the full-precision rows
+            exact = self._float_matrix()[positions] @ query
+            positions, scores = select_top_k(exact, top_k, positions)
+        return positions, scores
+
+    def keyword_nearest(self, query, top_k):
+        """
+        Return the row positions, BM25 scores and number of matched query terms of the `top_k`
+        rows best matching the query text, best first. No embedding is involved.
+        """
+        if self.keyword_index is None:
+            raise ValueError("Keyword search requested but no keyword index is configured.")
+        if self.directory is not None:
+            self.refresh()
+        return self.keyword_index.search(query, top_k)
+
+    def _triples(self, positions, scores):
+        return [(self._id_at(pos), self._text_at(pos), float(score)) for pos, score in zip(positions, scores)]
+
+    def search(self, query_embedding, top_k=3, approximate=None):
+        """
+        Return (id, text, score) triples for the rows closest to the query, best first.
+        """
+        with self.lock:
+            positions, scores = self.nearest(query_embedding, top_k, approximate)
+            return self._triples(positions, scores)
+
+    def keyword_search(self, query, top_k=3):
+        """
+        Return (id, text, BM25 score) triples for the rows best matching the query text, best first.
+        """
+        with self.lock:
+            positions, scores, _ = self.keyword_nearest(query, top_k)
+            return self._triples(positions, scores)
+
+    def hybrid_search(self, query, query_embedding, top_k=3, approximate=None, candidates=4, keyword_weight=1.0):
+        """
+        Return (id, text, fused score) triples combining the vector and BM25 rankings of
+        `top_k * candidates` rows each with reciprocal-rank fusion, best first.
+        """
+        with self.lock:
+            fetch = top_k * candidates
+            vector_positions, _ = self.nearest(query_embedding, fetch, approximate)
+            keyword_positions, _, _ = self.keyword_nearest(query, fetch)
+            positions, scores = reciprocal_rank_fusion(
+                [vector_positions, keyword_positions], [1.0, keyword_weight]
+            )
+            positions, scores = select_top_k(scores, top_k, positions)
+            return self._triples(positions, scores)
+
+    def save(self, directory=None):
+        """
+        Persist rows added since the last save as a new append-only segment in `directory`
+        (defaults to the directory the collection was loaded from), then swap the live buffer for
+        read-only memory maps of the saved data. Rows are given IDs from the manifest's
+        shared counter so that IDs stay unique across worker processes.
+        """
+        directory = directory or self.directory
+        if directory is None:
+            raise ValueError("No directory given to save the embedding collection to.")
+        if self.directory is not None and os.path.abspath(directory) != os.path.abspath(self.directory):
+            raise ValueError("A loaded collection can only be saved back to its own directory.")
+        if not self.keep_vectors:
+            raise ValueError("This collection only keeps quantized codes and cannot be saved.")
+        with self.lock:
+            os.makedirs(directory, exist_ok=True)
+            live = self.size - self.frozen_size
+            with manifest_lock(directory):
+                manifest = read_manifest(directory)
+                foreign = len(manifest["segments"]) - len(self.segments)  # Segments saved by other processes
+                if manifest["dimension"] is not None and live and manifest["dimension"] != self.dimension:
+                    raise ValueError("Stored embedding dimension does not match the saved store.")
+                if live:
+                    first_id = manifest["next_id"]
+                    name = f"segment-{len(manifest['segments']):06d}"
+                    write_segment(
+                        directory, name, self.embeddings[:live],
+                        np.arange(first_id, first_id + live, dtype=np.int64), self.texts,
+                    )
+                    manifest["segments"].append({"name": name, "rows": live})
+                    manifest["next_id"] = first_id + live
+                    manifest["dimension"] = self.dimension
+                    write_manifest(directory, manifest)
+                mtime = manifest_mtime(directory)
+            self.directory = directory
+
+            # The live rows now exist on disk; reattach from the manifest to serve them from the mapping.
+            # Their positions only stay valid for the index if no foreign segments were slotted in before them.
+            if foreign == 0:
+                indexed_size = self.size
+            elif live == 0:
+                indexed_size = self.frozen_size
+            else:
+                indexed_size = 0  # The index cannot drop stale positions, so rebuild it
+            self.embeddings, self.ids, self.texts = None, np.empty(0, dtype=np.int64), []
+            if indexed_size == 0:
+                self.codes = None  # Positions moved, so re-encode below
+            self.size = self.frozen_size
+            self._attach_manifest(manifest, mtime, indexed_size)
+            logging.info("Saved %d new rows to %s (%d rows total).", live, directory, self.size)
+
+    def refresh(self, force=False):
+        """
+        Attach segments that were added to the manifest (by this or another process) since the
+        last refresh. Only the manifest's mtime is checked when nothing changed.
+        """
+        if self.directory is None:
+            return
+        with self.lock:
+            mtime = manifest_mtime(self.directory)
+            if mtime is None or (mtime == self._manifest_mtime and not force):
+                return
+            if self.size != self.frozen_size:
+                # Unsaved live rows sit after the persisted rows; new segments are attached on the next save
+                return
+            self._attach_manifest(read_manifest(self.directory), mtime, self.frozen_size)
+
+    def _attach_manifest(self, manifest, mtime, indexed_size):
+        """
+        Memory-map the manifest's segments that are not loaded yet, then index and encode their rows.
+        Rows before `indexed_size` are already indexed and encoded under their current positions.
+        """
+        names = [entry["name"] for entry in manifest["segments"]]
+        loaded = [segment.name for segment in self.segments]
+        if names[: len(loaded)] != loaded:
+            raise ValueError(f"Manifest in {self.directory} no longer matches the loaded segments.")
+        for name in names[len(loaded):]:
+            self.segments.append(PersistedSegment(self.directory, name))
+        self.frozen_size = self.size = sum(len(segment) for segment in self.segments)
+        self.current_id = max(self.current_id, manifest["next_id"])
+        self._manifest_mtime = mtime
+
+        if self.quantized and self.size > indexed_size:
+            self._encode_rows(indexed_size)
+        elif self.codec is not None and not self.quantized and self.size >= self.codec_train_size:
+            self._train_codec()
+        if self.index is not None and self.size > indexed_size:
+            if indexed_size == 0:
+                self.index.reset()
+            self.index.add(np.arange(indexed_size, self.size), self._matrix())
+        if self.keyword_index is not None and self.size > indexed_size:
+            if indexed_size == 0:
+                self.keyword_index.reset()
+            for position in range(indexed_size, self.size):
+                self.keyword_index.add(position, self._text_at(position))
+        logging.debug("Embedding collection attached: %d segments, %d rows.", len(self.segments), self.size)
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """
+        Open a saved collection without re-embedding anything. Vectors and texts are memory-mapped
+        read-only; `kwargs` are passed to the constructor (e.g. `index=`, which is rebuilt
+        from the mapped vectors).
+        """
+        collection = cls(**kwargs)
+        collection.directory = directory
+        collection.refresh(force=True)
+        logging.info("Loaded embedding collection from %s with %d rows.", directory, collection.size)
+        return collection
+
 
 class EmbeddingStorage:
     """
     A class to store and manage text embeddings, providing functionality to add,
     retrieve, and find relevant text segments based on embeddings.
+
+    Rows are partitioned into namespaces (e.g. one per session or document), each held by
+    its own `EmbeddingCollection` with its own matrix and index, so a search only touches
+    the namespace it is asked about. Namespaces other than the default one are evicted
+    from memory once they have not been used for `ttl` seconds.
+
+    Retrieval `mode` is one of "vector" (embedding similarity), "keyword" (BM25 only, no
+    embedding call), "hybrid" (both, fused by rank) or "auto" (keyword results when the best
+    hit contains every query term, hybrid otherwise); all but "vector" need `keyword_index_factory`.
     """
 
-    def __init__(self):
-        self.id_to_embedding = {}  # Maps unique IDs to embeddings
-        self.id_to_text = {}  # Maps unique IDs to original text segments
-        self.current_id = 0  # Tracks the next ID to assign
+    def __init__(self, initial_capacity=1024, index_factory=None, client=None, model=EMBEDDING_MODEL,
+                 max_batch_size=256, max_batch_tokens=50000, max_retries=3, retry_backoff=1.0, cache=None,
+                 async_client=None, ttl=None, codec_factory=None, codec_train_size=4096, rerank=0,
+                 keyword_index_factory=None, retrieval_mode="vector"):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode!r}")
+        self.initial_capacity = initial_capacity  # Rows allocated on a collection's first insert
+        self.index_factory = index_factory  # Callable returning a fresh ANN index per namespace, or None
+        self.codec_factory = codec_factory  # Callable returning a fresh vector codec per namespace, or None
+        self.codec_train_size = codec_train_size
+        self.rerank = rerank  # Full-precision re-ranking factor for quantized namespaces
+        self.keyword_index_factory = keyword_index_factory  # Callable returning a fresh BM25 index, or None
+        self.retrieval_mode = retrieval_mode  # Default mode for find_relevant_segments*
+        self.collections = {}  # Namespace -> EmbeddingCollection currently in memory
+        self.ttl = ttl  # Seconds of inactivity after which a namespace is evicted; None keeps everything
+        self.directory = None  # Store directory; namespaces are persisted below it
+        self.client = client or openai_client  # OpenAI-compatible client; injectable for fakes/stub servers
+        self.model = model
+        self.max_batch_size = max_batch_size  # Items per embeddings request
+        self.max_batch_tokens = max_batch_tokens  # Estimated tokens per embeddings request
+        self.max_retries = max_retries  # Retries per failed sub-batch
+        self.retry_backoff = retry_backoff  # Base delay in seconds, doubled on every retry
+        self.cache = cache  # Optional `embedding_cache.EmbeddingCache` shared by ingestion and queries
+        self.async_client = async_client  # AsyncOpenAI-compatible client for concurrent ingestion
+        self.lock = threading.RLock()  # Guards the namespace table
 
         # Check for API key presence and raise an error if it's not set
         if not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OPENAI_API_KEY environment variable not set.")
         logging.debug("EmbeddingStorage initialized.")
 
+    @property
+    def size(self):
+        """
+        Total number of rows across the namespaces currently in memory.
+        """
+        return sum(collection.size for collection in list(self.collections.values()))
+
+    @property
+    def id_to_text(self):
+        """
+        Mapping of unique IDs to original text segments in the default namespace.
+        """
+        return self.collection().id_to_text
+
+    def _namespace_directory(self, namespace):
+        """
+        Where a namespace is persisted: the store directory itself for the default namespace,
+        `namespaces/<name>` below it for every other one.
+        """
+        if namespace == DEFAULT_NAMESPACE:
+            return self.directory
+        return os.path.join(self.directory, "namespaces", namespace)
+
+    def collection(self, namespace=DEFAULT_NAMESPACE, create=True):
+        """
+        Return the collection for `namespace`, reopening it from disk or creating it as needed.
+        Returns None if it does not exist and `create` is False.
+        """
+        if not NAMESPACE_PATTERN.match(namespace):
+            raise ValueError(f"Invalid namespace: {namespace!r}")
+        self.evict_expired()
+        with self.lock:
+            collection = self.collections.get(namespace)
+            if collection is None:
+                directory = self._namespace_directory(namespace) if self.directory else None
+                if not create and (directory is None or manifest_mtime(directory) is None):
+                    return None
+                options = dict(
+                    initial_capacity=self.initial_capacity,
+                    index=self.index_factory() if self.index_factory else None,
+                    codec=self.codec_factory() if self.codec_factory else None,
+                    codec_train_size=self.codec_train_size,
+                    rerank=self.rerank,
+                    keep_vectors=directory is not None,  # Saving needs the full-precision rows
+                    keyword_index=self.keyword_index_factory() if self.keyword_index_factory else None,
+                )
+                if directory:
+                    # Bound to its directory even before the first save, so it sees other workers' rows
+                    collection = EmbeddingCollection.load(directory, **options)
+                else:
+                    collection = EmbeddingCollection(**options)
+                self.collections[namespace] = collection
+                logging.debug("Opened namespace '%s'.", namespace)
+            collection.last_access = time.monotonic()
+            return collection
+
+    def evict_expired(self):
+        """
+        Drop namespaces (other than the default) that have been idle for longer than `ttl`,
+        freeing their matrices and indexes. Saved namespaces are reopened from disk on next use.
+        """
+        if self.ttl is None:
+            return []
+        cutoff = time.monotonic() - self.ttl
+        with self.lock:
+            expired = [
+                namespace for namespace, collection in self.collections.items()
+                if namespace != DEFAULT_NAMESPACE and collection.last_access < cutoff
+            ]
+            for namespace in expired:
+                del self.collections[namespace]
+        if expired:
+            logging.info("Evicted %d idle namespaces.", len(expired))
+        return expired
+
+    def drop_namespace(self, namespace):
+        """
+        Forget a namespace immediately (e.g. when its session is reset or expires): its in-memory
+        rows and, in a persisted store, its directory. The default namespace is never deleted.
+        """
+        with self.lock:
+            dropped = self.collections.pop(namespace, None) is not None
+            if self.directory and namespace != DEFAULT_NAMESPACE and NAMESPACE_PATTERN.match(namespace):
+                directory = self._namespace_directory(namespace)
+                if os.path.isdir(directory):
+                    shutil.rmtree(directory, ignore_errors=True)  # Other workers keep their open mappings
+                    dropped = True
+        return dropped
+
+    def add_embedding(self, text, embedding, namespace=DEFAULT_NAMESPACE):
+        """
+        Append a single embedding and its text to a namespace, returning the assigned ID.
+        """
+        return self.collection(namespace).add_embedding(text, embedding)
+
     def get_text_embedding(self, text):
         """
         Fetch the embedding for a given text using OpenAI's embedding model.
         """
         logging.debug("Fetching embedding for text: '%s'", text[:30])  # Log the initial part of the text
+        if self.cache is not None:
+            cached = self.cache.get(self.model, text)
+            if cached is not None:
+                logging.debug("Embedding served from cache.")
+                return cached
         try:
             # Call OpenAI API to create embeddings
-            response = client.embeddings.create(
-                input=[text], model="text-embedding-ada-002"
+            response = self.client.embeddings.create(
+                input=[text], model=self.model
             )
             embedding_vector = response.data[0].embedding
             if np.any(embedding_vector):  # Check if the embedding is not a zero vector
                 logging.debug("Valid embedding vector generated.")
+                if self.cache is not None:
+                    self.cache.put(self.model, text, embedding_vector)
                 return np.array(embedding_vector)
             else:
                 logging.warning("Received a zero vector as embedding for text: '%s'", text[:30])
@@ -46,62 +625,382 @@ class EmbeddingStorage:
             logging.error("Failed to get embedding from OpenAI for text: '%s', error: %s", text[:30], e)
             return None
 
-    def store_transcription(self, transcript_segments):
+    async def get_text_embedding_async(self, text, client=None):
         """
-        Store embeddings and their corresponding text from transcription segments.
+        Async counterpart of `get_text_embedding`. `client` defaults to `async_client`; callers
+        serving many queries should pass one long-lived client so its connection pool is reused.
         """
-        logging.debug("Storing transcriptions and embeddings.")
-        for segment in transcript_segments:
-            text = segment.get("text", "")
-            embedding = self.get_text_embedding(text)
-            if embedding is not None:
-                self.id_to_text[self.current_id] = text
-                self.id_to_embedding[self.current_id] = embedding
-                self.current_id += 1  # Increment the ID for the next entry
+        logging.debug("Fetching embedding for text: '%s'", text[:30])
+        if self.cache is not None:
+            cached = self.cache.get(self.model, text)
+            if cached is not None:
+                logging.debug("Embedding served from cache.")
+                return cached
+        try:
+            client = client or self.async_client
+            if client is not None:
+                embedding_vector = (await self._embed_batch_async(client, [text]))[0]
             else:
+                # A client's connection pool is bound to the event loop, so create one per call
+                async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) as client:
+                    embedding_vector = (await self._embed_batch_async(client, [text]))[0]
+        except Exception as e:
+            logging.error("Failed to get embedding from OpenAI for text: '%s', error: %s", text[:30], e)
+            return None
+        if not np.any(embedding_vector):
+            logging.warning("Received a zero vector as embedding for text: '%s'", text[:30])
+            return None
+        if self.cache is not None:
+            self.cache.put(self.model, text, embedding_vector)
+        return np.array(embedding_vector)
+
+    def _embed_batch(self, texts):
+        """
+        Embed a list of texts with a single API call, returning vectors in input order.
+        Raises on any API error so the caller can retry the batch.
+        """
+        with metrics.span("embedding_request", texts=len(texts)):
+            response = self.client.embeddings.create(input=texts, model=self.model)
+        vectors = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = item.embedding  # The API may return items out of order
+        if any(vector is None for vector in vectors):
+            raise ValueError("Embedding response is missing items.")
+        return vectors
+
+    def _after_failure(self, batch, attempt, error, texts):
+        """
+        What to do with a batch of indices into `texts` whose embeddings request failed: returns
+        (delay, [(batch, attempt), ...]) to resend. Transient errors (rate limits, server and
+        network errors) resend the same batch with exponential backoff until `max_retries` is used
+        up, then give the batch up; splitting it would only multiply requests to a struggling API.
+        Requests the API rejects (other 4xx, e.g. a bad input or too many tokens) are bisected so
+        only the inputs at fault are dropped; bisecting does not count as a retry.
+        """
+        status = getattr(error, "status_code", None)
+        if status is None or status == 429 or status >= 500:
+            if attempt < self.max_retries:
+                logging.warning("Embedding batch of %d texts failed (attempt %d): %s", len(batch), attempt + 1, error)
+                return self.retry_backoff * 2 ** attempt, [(batch, attempt + 1)]
+            logging.error("Giving up on %d texts after %d attempts, error: %s", len(batch), attempt + 1, error)
+            return 0, []
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            logging.debug("Splitting failed batch of %d texts to isolate bad inputs: %s", len(batch), error)
+            return 0, [(batch[:middle], attempt), (batch[middle:], attempt)]
+        logging.error("Giving up on text '%s' after %d attempts, error: %s", texts[batch[0]][:30], attempt + 1, error)
+        return 0, []
+
+    def get_text_embeddings(self, texts):
+        """
+        Fetch embeddings for many texts using batched API calls.
+        Returns a list aligned with `texts`, holding None for texts that could not be embedded.
+        Cached and repeated texts are not sent; failing batches are retried and bisected (see
+        `_after_failure`), so only texts the API cannot embed are left out.
+        """
+        results = [None] * len(texts)
+        missing = {}  # Text -> indices in `texts` still needing an embedding
+        for i, text in enumerate(texts):
+            cached = self.cache.get(self.model, text) if self.cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.setdefault(text, []).append(i)
+        unique = list(missing)
+        pending = [(batch, 0) for batch in pack_batches(unique, self.max_batch_size, self.max_batch_tokens)]
+        logging.debug("Embedding %d texts (%d uncached) in %d batches.", len(texts), len(unique), len(pending))
+        while pending:
+            batch, attempt = pending.pop(0)
+            try:
+                vectors = self._embed_batch([unique[u] for u in batch])
+            except Exception as e:
+                delay, retries = self._after_failure(batch, attempt, e, unique)
+                if delay:
+                    time.sleep(delay)
+                pending[:0] = retries
+                continue
+            embedded = []
+            for u, vector in zip(batch, vectors):
+                if not np.any(vector):
+                    logging.warning("Received a zero vector as embedding for text: '%s'", unique[u][:30])
+                    continue
+                vector = np.array(vector)
+                for i in missing[unique[u]]:
+                    results[i] = vector
+                embedded.append((unique[u], vector))
+            if self.cache is not None:
+                self.cache.put_many(self.model, embedded)
+        return results
+
+    def store_transcription(self, transcript_segments, namespace=DEFAULT_NAMESPACE):
+        """
+        Store embeddings and their corresponding text from transcription segments.
+        Segments are embedded in batches; IDs are assigned in segment order.
+        Returns the embeddings aligned with the segments (None where none could be obtained).
+        """
+        logging.debug("Storing transcriptions and embeddings in namespace '%s'.", namespace)
+        collection = self.collection(namespace)
+        texts = [segment.get("text", "") for segment in transcript_segments]
+        embeddable = [i for i, text in enumerate(texts) if text.strip()]  # The API rejects empty input
+        embeddings = [None] * len(texts)
+        with metrics.span("embed", segments=len(embeddable)):
+            for i, embedding in zip(embeddable, self.get_text_embeddings([texts[i] for i in embeddable])):
+                embeddings[i] = embedding
+        stored = 0
+        with metrics.span("index_add") as span:
+            for text, embedding in zip(texts, embeddings):
+                if embedding is None or collection.add_embedding(text, embedding) is None:
+                    logging.warning("No valid embedding generated for segment: %s...", text[:30])
+                else:
+                    stored += 1
+            span.set(segments=stored)
+        logging.info("Stored %d of %d segments.", stored, len(transcript_segments))
+        return embeddings
+
+    def store_embeddings(self, transcript_segments, embeddings, namespace=DEFAULT_NAMESPACE):
+        """
+        Store segments with embeddings computed earlier (e.g. from a transcript cache), without
+        any API call. `embeddings` is aligned with the segments; None entries are skipped.
+        """
+        collection = self.collection(namespace)
+        stored = 0
+        for segment, embedding in zip(transcript_segments, embeddings):
+            if embedding is not None and collection.add_embedding(segment.get("text", ""), embedding) is not None:
+                stored += 1
+        logging.info("Stored %d of %d precomputed segments.", stored, len(transcript_segments))
+        return stored
+
+    async def _embed_batch_async(self, client, texts):
+        """
+        Async counterpart of `_embed_batch`.
+        """
+        with metrics.span("embedding_request", texts=len(texts)):
+            response = await client.embeddings.create(input=texts, model=self.model)
+        vectors = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = item.embedding
+        if any(vector is None for vector in vectors):
+            raise ValueError("Embedding response is missing items.")
+        return vectors
+
+    async def store_transcription_async(self, transcript_segments, concurrency=4,
+                                        requests_per_minute=3000, tokens_per_minute=1000000,
+                                        namespace=DEFAULT_NAMESPACE):
+        """
+        Embed and store transcription segments with up to `concurrency` batches in flight,
+        throttled by request and token buckets. Each batch is added to the store as soon as it
+        returns, so early segments are searchable while later ones are still being embedded;
+        IDs therefore follow completion order rather than segment order.
+        Returns the embeddings aligned with the segments (None where none could be obtained).
+        """
+        collection = self.collection(namespace)
+        texts = [segment.get("text", "") for segment in transcript_segments]
+        missing = {}  # Text -> number of segments carrying it
+        vectors_by_text = {}  # Text -> embedding, to align the result with the segments
+        stored = 0
+        for text in texts:
+            if not text.strip():
                 logging.warning("No valid embedding generated for segment: %s...", text[:30])
-        logging.info("Stored %d segments.", len(transcript_segments))
+                continue
+            cached = self.cache.get(self.model, text) if self.cache is not None else None
+            if cached is not None:
+                vectors_by_text[text] = cached
+            if cached is not None and collection.add_embedding(text, cached) is not None:
+                stored += 1
+            elif cached is None:
+                missing[text] = missing.get(text, 0) + 1
+        unique = list(missing)
+        batches = pack_batches(unique, self.max_batch_size, self.max_batch_tokens)
+        logging.debug("Embedding %d uncached texts in %d batches, %d at a time.", len(unique), len(batches), concurrency)
 
-    def find_relevant_segments(self, query, top_k=3):
+        semaphore = asyncio.Semaphore(concurrency)
+        request_bucket = TokenBucket(requests_per_minute / 60, capacity=concurrency)
+        token_bucket = TokenBucket(tokens_per_minute / 60, capacity=self.max_batch_tokens)
+
+        async def run_batch(client, batch, attempt):
+            nonlocal stored
+            batch_texts = [unique[u] for u in batch]
+            async with semaphore:
+                await request_bucket.acquire()
+                await token_bucket.acquire(sum(estimate_tokens(text) for text in batch_texts))
+                try:
+                    vectors = await self._embed_batch_async(client, batch_texts)
+                    error = None
+                except Exception as e:
+                    error = e
+            if error is not None:
+                # Retry outside the semaphore so backoff does not hold a concurrency slot
+                delay, retries = self._after_failure(batch, attempt, error, unique)
+                if delay:
+                    await asyncio.sleep(delay)
+                await asyncio.gather(*(run_batch(client, part, part_attempt) for part, part_attempt in retries))
+                return
+            embedded = []
+            for text, vector in zip(batch_texts, vectors):
+                if not np.any(vector):
+                    logging.warning("Received a zero vector as embedding for text: '%s'", text[:30])
+                    continue
+                vector = np.array(vector)
+                vectors_by_text[text] = vector
+                for _ in range(missing[text]):
+                    if collection.add_embedding(text, vector) is not None:
+                        stored += 1
+                embedded.append((text, vector))
+            if self.cache is not None:
+                self.cache.put_many(self.model, embedded)
+
+        if self.async_client is not None:
+            await asyncio.gather(*(run_batch(self.async_client, batch, 0) for batch in batches))
+        else:
+            # A client's connection pool is bound to the event loop, so create one per run
+            async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) as client:
+                await asyncio.gather(*(run_batch(client, batch, 0) for batch in batches))
+        logging.info("Stored %d of %d segments.", stored, len(transcript_segments))
+        return [vectors_by_text.get(text) for text in texts]
+
+    def store_transcription_concurrent(self, transcript_segments, **kwargs):
         """
-        Find and return the top-k most relevant text segments for a given query based on cosine similarity.
+        Blocking wrapper around `store_transcription_async` for synchronous callers such as Flask views.
         """
-        logging.debug("Finding relevant segments for query: %s", query)
+        with metrics.span("embed", segments=len(transcript_segments)):
+            return asyncio.run(self.store_transcription_async(transcript_segments, **kwargs))
+
+    def search_embedding(self, query_embedding, top_k=3, approximate=None, namespace=DEFAULT_NAMESPACE):
+        """
+        Search with an already computed query embedding and return (id, score) pairs, best first.
+        """
+        collection = self.collection(namespace, create=False)
+        if collection is None:
+            return []
+        return [(id, score) for id, _, score in collection.search(query_embedding, top_k, approximate)]
+
+    def _retrieve(self, query, top_k, approximate, namespace, mode):
+        """
+        Run a query in the given retrieval mode and return (id, text, score) triples, best first.
+        """
+        collection, mode, results = self._retrieve_without_embedding(query, top_k, namespace, mode)
+        if results is not None:
+            return results
         query_embedding = self.get_text_embedding(query)
+        return self._retrieve_with_embedding(collection, mode, query, query_embedding, top_k, approximate)
+
+    async def _retrieve_async(self, query, top_k, approximate, namespace, mode, client=None):
+        """
+        Async counterpart of `_retrieve`: the query embedding is awaited on `client`, and the
+        searches run in worker threads so they do not stall the event loop.
+        """
+        collection, mode, results = await asyncio.to_thread(
+            self._retrieve_without_embedding, query, top_k, namespace, mode
+        )
+        if results is not None:
+            return results
+        query_embedding = await self.get_text_embedding_async(query, client)
+        return await asyncio.to_thread(
+            self._retrieve_with_embedding, collection, mode, query, query_embedding, top_k, approximate
+        )
+
+    def _retrieve_without_embedding(self, query, top_k, namespace, mode):
+        """
+        First half of a query: returns (collection, mode, results), where results is None when
+        the query embedding is needed to answer it.
+        """
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode!r}")
+        collection = self.collection(namespace, create=False)
+        if collection is None:
+            logging.info("Namespace '%s' holds no segments.", namespace)
+            return None, mode, []
+        if mode == "keyword":
+            return collection, mode, collection.keyword_search(query, top_k)
+        if mode == "auto":
+            with collection.lock:
+                positions, scores, matched = collection.keyword_nearest(query, top_k)
+                if len(positions) and matched[0] == len(set(tokenize(query))):
+                    logging.debug("Query answered by keyword search alone.")
+                    return collection, mode, collection._triples(positions, scores)
+        return collection, mode, None
+
+    def _retrieve_with_embedding(self, collection, mode, query, query_embedding, top_k, approximate):
         if query_embedding is None:
             logging.warning("Query embedding retrieval failed. Returning no relevant segments.")
             return []
+        if mode == "vector":
+            return collection.search(query_embedding, top_k, approximate)
+        return collection.hybrid_search(query, query_embedding, top_k, approximate)
 
-        # Calculate cosine similarities and sort them
-        scores = {
-            id: np.dot(query_embedding, self.id_to_embedding[id]) / (np.linalg.norm(query_embedding) * np.linalg.norm(self.id_to_embedding[id]))
-            for id in self.id_to_embedding if np.any(self.id_to_embedding[id])
-        }
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
-
+    def find_relevant_segments(self, query, top_k=3, approximate=None, namespace=DEFAULT_NAMESPACE, mode=None):
+        """
+        Find and return the top-k most relevant text segments for a given query.
+        `approximate` forces exact (False) or index-based (True) vector search; by default the index is
+        used if configured. `mode` overrides the store's retrieval mode. Only the rows of `namespace` are searched.
+        """
+        logging.debug("Finding relevant segments for query: %s", query)
         # Return the most relevant segments
-        relevant_segments = [{"text": self.id_to_text[id]} for id, _ in sorted_scores]
+        relevant_segments = [
+            {"text": text} for _, text, _ in self._retrieve(query, top_k, approximate, namespace, mode)
+        ]
         logging.info("Found %d relevant segments for query.", len(relevant_segments))
         return relevant_segments
 
-    def find_relevant_segments_with_metadata(self, query, top_k=3):
+    async def find_relevant_segments_async(self, query, top_k=3, approximate=None, namespace=DEFAULT_NAMESPACE,
+                                           mode=None, client=None):
         """
-        Similar to `find_relevant_segments` but returns metadata alongside the text.
+        Async counterpart of `find_relevant_segments` for event-loop servers, embedding the query
+        with `client` (an AsyncOpenAI-compatible client; see `get_text_embedding_async`).
         """
-        logging.debug("Finding relevant segments with metadata for query: %s", query)
-        query_embedding = self.get_text_embedding(query)
-        if query_embedding is None:
-            logging.warning("Query embedding retrieval failed. Returning no relevant segments.")
-            return []
-
-        # Calculate cosine similarities and sort them
-        scores = {
-            id: np.dot(query_embedding, self.id_to_embedding[id]) / (np.linalg.norm(query_embedding) * np.linalg.norm(self.id_to_embedding[id]))
-            for id in self.id_to_embedding if np.any(self.id_to_embedding[id])
-        }
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        logging.debug("Finding relevant segments for query: %s", query)
+        relevant_segments = [
+            {"text": text} for _, text, _ in await self._retrieve_async(query, top_k, approximate, namespace, mode,
+                                                                        client)
+        ]
+        logging.info("Found %d relevant segments for query.", len(relevant_segments))
+        return relevant_segments
 
+    def find_relevant_segments_with_metadata(self, query, top_k=3, approximate=None, namespace=DEFAULT_NAMESPACE,
+                                             mode=None):
+        """
+        Similar to `find_relevant_segments` but returns metadata alongside the text. Scores are cosine
+        similarities, BM25 scores or fused rank scores depending on the mode.
+        """
+        logging.debug("Finding relevant segments with metadata for query: %s", query)
         # Return the most relevant segments with additional metadata
-        relevant_segments_with_metadata = [( {"text": self.id_to_text[id], "id": id}, scores[id] ) for id, _ in sorted_scores]
+        relevant_segments_with_metadata = [
+            ({"text": text, "id": id}, score)
+            for id, text, score in self._retrieve(query, top_k, approximate, namespace, mode)
+        ]
         logging.info("Found %d relevant segments with metadata for query.", len(relevant_segments_with_metadata))
         return relevant_segments_with_metadata
+
+    def save(self, directory=None):
+        """
+        Persist every in-memory namespace with unsaved rows below `directory` (defaults to the
+        directory the store was loaded from). See `EmbeddingCollection.save`.
+        """
+        directory = directory or self.directory
+        if directory is None:
+            raise ValueError("No directory given to save the embedding store to.")
+        if self.directory is not None and os.path.abspath(directory) != os.path.abspath(self.directory):
+            raise ValueError("A loaded store can only be saved back to its own directory.")
+        self.directory = directory
+        with self.lock:
+            collections = list(self.collections.items())
+        with metrics.span("index_save") as span:
+            rows = 0
+            for namespace, collection in collections:
+                if collection.size > collection.frozen_size:
+                    rows += collection.size - collection.frozen_size
+                    collection.save(self._namespace_directory(namespace))
+            span.set(segments=rows)
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """
+        Open a saved store without re-embedding anything. Namespaces are memory-mapped lazily
+        on first use; `kwargs` are passed to the constructor.
+        """
+        storage = cls(**kwargs)
+        storage.directory = directory
+        storage.collection()  # Attach the default namespace up front so startup pays its index build
+        logging.info("Loaded embedding store from %s.", directory)
+        return storage
@@ -0,0 +1,147 @@
+import logging
+import numpy as np
+
+
+def select_top_k(scores, top_k, positions=None):
+    """
+    Pick the `top_k` highest scores and return (positions, scores) best first.
+    `positions` maps each score to a row position (defaults to 0..len(scores)-1);
+    ties keep ascending position order, matching a stable descending sort.
+    """
+    if positions is None:
+        positions = np.arange(len(scores))
+    if len(scores) == 0 or top_k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((positions[candidates], -scores[candidates]))
+    candidates = candidates[order]
+    return positions[candidates], scores[candidates]
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over L2-normalised vectors.
+
+    Vectors are bucketed by their closest k-means centroid; a query only scans the
+    `nprobe` buckets whose centroids are closest to it. The index is built incrementally:
+    until `train_size` vectors have been added it answers by exact search, then it trains
+    its centroids once and assigns every later vector to a bucket as it arrives.
+    """
+
+    def __init__(self, n_lists=256, nprobe=8, train_size=None, kmeans_iterations=20, seed=0):
+        self.n_lists = n_lists  # Number of k-means centroids / inverted lists
+        self.nprobe = nprobe  # Lists scanned per query; higher means better recall, slower search
+        self.train_size = train_size or n_lists * 39  # Vectors collected before training the centroids
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids = None  # (n_lists, dimension) float32, set once trained
+        self.lists = []  # Per-list growable arrays of row positions
+        self.list_sizes = np.zeros(n_lists, dtype=np.int64)
+        self.untrained = []  # Row positions added before training (searched exhaustively)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return int(self.list_sizes.sum()) + len(self.untrained)
+
+    def reset(self):
+        """
+        Drop the centroids and all list assignments.
+        """
+        self.centroids = None
+        self.lists = []
+        self.list_sizes = np.zeros(self.n_lists, dtype=np.int64)
+        self.untrained = []
+
+    def add(self, positions, matrix):
+        """
+        Register row `positions` of `matrix` (the store's embedding matrix) with the index,
+        training the centroids once enough vectors have been collected.
+        """
+        positions = np.atleast_1d(np.asarray(positions, dtype=np.int64))
+        if not self.is_trained:
+            self.untrained.extend(positions.tolist())
+            if len(self.untrained) >= max(self.train_size, self.n_lists):
+                self.train(matrix)
+            return
+        self._assign(positions, matrix[positions])
+
+    def train(self, matrix):
+        """
+        Run spherical k-means over the pending vectors and move them into their lists.
+        """
+        pending = np.asarray(self.untrained, dtype=np.int64)
+        vectors = matrix[pending]
+        logging.info("Training IVF index with %d lists on %d vectors.", self.n_lists, len(pending))
+        self.centroids = self._kmeans(vectors)
+        self.lists = [np.empty(16, dtype=np.int64) for _ in range(self.n_lists)]
+        self.list_sizes = np.zeros(self.n_lists, dtype=np.int64)
+        self.untrained = []
+        self._assign(pending, vectors)
+
+    def _kmeans(self, vectors):
+        """
+        Spherical k-means: centroids are re-normalised means, assignment is by inner product.
+        """
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(len(vectors), self.n_lists, replace=False)].astype(np.float32)
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random vectors so every list stays useful
+                sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        return centroids
+
+    def _assign(self, positions, vectors):
+        """
+        Append each position to the list of its nearest centroid.
+        """
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_id in np.unique(assignment):
+            new_positions = positions[assignment == list_id]
+            size = self.list_sizes[list_id]
+            required = size + len(new_positions)
+            bucket = self.lists[list_id]
+            if required > len(bucket):
+                grown = np.empty(max(required, 2 * len(bucket)), dtype=np.int64)
+                grown[:size] = bucket[:size]
+                self.lists[list_id] = bucket = grown
+            bucket[size:required] = new_positions
+            self.list_sizes[list_id] = required
+
+    def candidates(self, query, nprobe=None):
+        """
+        Return the row positions stored in the `nprobe` lists closest to `query`.
+        """
+        pending = np.asarray(self.untrained, dtype=np.int64)
+        if not self.is_trained:
+            return pending
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        parts = [self.lists[list_id][: self.list_sizes[list_id]] for list_id in probed]
+        parts.append(pending)
+        return np.concatenate(parts)
+
+    def search(self, query, matrix, top_k, nprobe=None):
+        """
+        Approximate top-k search for a unit-length float32 `query` against `matrix`.
+        Returns (positions, scores) best first.
+        """
+        positions = self.candidates(query, nprobe)
+        if len(positions) == 0:
+            return select_top_k(np.empty(0, dtype=np.float32), top_k)
+        positions.sort()
+        scores = matrix[positions] @ query
+        return select_top_k(scores, top_k, positions)
@@ -0,0 +1,162 @@
+"""
+Asynchronous '/ask' for ASGI servers.
+
+The Flask '/ask' view holds a worker thread for a whole query: the query embedding call, the
+search and the chat completion, so the number of worker threads caps the queries in flight.
+`AskApp` wraps the Flask app as an ASGI application that answers POST '/ask' on the event
+loop instead. Both OpenAI calls are awaited on one long-lived AsyncOpenAI client, so every
+query shares its connection pool, and the searches and session-store reads and writes run in
+worker threads so they do not stall the loop. Every other request goes to the Flask app
+through asgiref's WSGI adapter. Responses and sessions are the same as with the Flask view:
+
+    app = Flask(__name__)  # with the 'process' blueprint registered and its components initialized
+    asgi_app = AskApp(app)  # then e.g. `uvicorn module:asgi_app`
+
+`benchmark_ask.py` load-tests both variants against `fake_openai_server`.
+"""
+import asyncio
+import io
+import logging
+import os
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask import current_app, jsonify
+from openai import AsyncOpenAI
+
+from process import session_namespace
+
+MAX_BODY_BYTES = 1 << 20  # An '/ask' body is a JSON query; anything larger is refused
+
+
+def wsgi_environ(scope, body=b""):
+    """
+    The WSGI environ for an ASGI HTTP scope, enough to build a Flask request and open its session.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AskApp:
+    """
+    ASGI application serving POST `path` ('/ask') asynchronously and everything else through
+    `flask_app`. `client` is the AsyncOpenAI-compatible client for the queries; by default one
+    is created on the first query (a client's connection pool belongs to the event loop that
+    first uses it) and closed when the server shuts down.
+    """
+
+    def __init__(self, flask_app, path="/ask", client=None):
+        self.flask_app = flask_app
+        self.path = path
+        self.client = client
+        self.owns_client = client is None
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == self.path and scope["method"] == "POST":
+            await self._ask(scope, receive, send)
+        else:
+            # Without a context of its own every WSGI request would run on asgiref's one shared thread
+            async with ThreadSensitiveContext():
+                await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.owns_client and self.client is not None:
+                    await self.client.close()
+                    self.client = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _client(self):
+        if self.client is None:
+            self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self.client
+
+    async def _ask(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                await self._send(
+                    send, 413, [(b"content-type", b"application/json")], b'{"error":"Request too large"}\n'
+                )
+                return
+            if not message.get("more_body"):
+                break
+
+        with self.flask_app.request_context(wsgi_environ(scope, bytes(body))) as context:
+            response = await self._answer(context)
+            self.flask_app.session_interface.save_session(self.flask_app, context.session, response)
+        await self._send(
+            send, response.status_code,
+            [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()],
+            response.get_data(),
+        )
+
+    async def _answer(self, context):
+        """
+        The '/ask' response for the request in `context`, as the Flask view would build it.
+        """
+        logging.info("Received a request to '/ask' endpoint (async).")
+        data = context.request.get_json(silent=True)
+        query = data.get("query") if isinstance(data, dict) else None
+        if not query:
+            logging.error("No query provided in the request.")
+            response = jsonify({"error": "No query provided"})
+            response.status_code = 400
+            return response
+        logging.info("Query received: %s", query)
+
+        session_id = session_namespace()
+        session_store = current_app.session_store
+        try:
+            conversation_history = await asyncio.to_thread(session_store.conversation, session_id)
+            response_text, metadata = await current_app.gpt_integration.handle_query_async(
+                conversation_history, query, namespace=session_id, client=self._client()
+            )
+            await asyncio.to_thread(
+                session_store.append_messages, session_id,
+                [{"role": "user", "content": query}, {"role": "assistant", "content": response_text}],
+            )
+            logging.info("GPT response appended to conversation history.")
+            return jsonify({"response": response_text})
+        except Exception as e:
+            logging.error("Failed to process the query: %s", e, exc_info=True)
+            response = jsonify({"error": "Error processing your query"})
+            response.status_code = 500
+            return response
+
+    @staticmethod
+    async def _send(send, status, headers, body):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,199 @@
+"""
+Load test for '/ask': the Flask view on a fixed number of worker threads against the
+asynchronous `async_ask.AskApp`, both answering from a local `fake_openai_server` that adds
+`--latency` seconds to every embeddings and chat completion request.
+
+Each of `--concurrency` clients sends its share of `--requests` queries back to back, from
+one of `--sessions` sessions holding `--segments` transcript segments each. The WSGI variant
+serves at most `--workers` queries at once, like a threaded worker process; the ASGI variant
+runs every query on one event loop. Both apps are called in-process, without an HTTP server
+in front, so the difference is the view itself. Prints throughput and p50/p99 latency:
+
+    python benchmark_ask.py --concurrency 8 64 256 --workers 8 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from fake_openai_server import start_server
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # EmbeddingStorage refuses to start without one
+
+VARIANTS = ("wsgi", "asgi")
+
+
+def build_app(base_url, args):
+    """
+    A Flask app with the 'process' blueprint, its components pointed at the fake server, and
+    `args.sessions` sessions with transcripts. Returns (app, session cookies).
+    """
+    os.environ["OPENAI_BASE_URL"] = base_url  # Picked up by every OpenAI client created from here on
+    from flask import Flask
+    from openai import OpenAI
+    import process
+
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+    app.config.update(UPLOAD_FOLDER=tempfile.mkdtemp(), WHISPER_WARMUP=False, RETRIEVAL_MODE=args.retrieval_mode)
+    app.register_blueprint(process.bp)
+    with app.app_context():
+        storage, _ = process.initialize_components(app.config)
+    storage.client = OpenAI(api_key="benchmark", base_url=base_url)
+    app.embedding_storage = storage
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+    cookies = []
+    for s in range(args.sessions):
+        session_id = uuid.uuid4().hex
+        segments = [{"text": f"Session {s} segment {i} covers topic {i % 16}."} for i in range(args.segments)]
+        storage.store_transcription(segments, namespace=session_id)
+        cookies.append(f"{cookie_name}={serializer.dumps({'session_id': session_id})}")
+    return app, cookies
+
+
+def query_text(i):
+    return f"What was said about topic {i % 16} in question {i}?"  # Unique, so the embedding cache never answers
+
+
+def summarise(variant, concurrency, latencies, errors, seconds, server):
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "variant": variant,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "api_requests": server.request_count,
+    }
+
+
+def run_wsgi(app, cookies, concurrency, args):
+    """
+    `concurrency` client threads calling the Flask view, at most `args.workers` of them at a time.
+    """
+    workers = threading.Semaphore(args.workers)
+    per_client = max(args.requests // concurrency, 1)
+    latencies, errors = [], []
+
+    def client(c):
+        test_client = app.test_client(use_cookies=False)  # Each query carries its session cookie
+        for r in range(per_client):
+            i = c * per_client + r
+            start = time.perf_counter()
+            with workers:
+                response = test_client.post(
+                    "/ask", json={"query": query_text(i)}, headers={"Cookie": cookies[i % len(cookies)]}
+                )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return latencies, len(errors), time.perf_counter() - start
+
+
+async def run_asgi(app, cookies, concurrency, args, base_url):
+    """
+    `concurrency` client coroutines calling `AskApp` on one event loop with a shared client.
+    """
+    from openai import AsyncOpenAI
+    from async_ask import AskApp
+
+    per_client = max(args.requests // concurrency, 1)
+    latencies, errors = [], []
+    async with AsyncOpenAI(api_key="benchmark", base_url=base_url) as openai_client:
+        asgi_app = AskApp(app, client=openai_client)
+
+        async def ask(i):
+            body = json.dumps({"query": query_text(i)}).encode()
+            scope = {
+                "type": "http", "method": "POST", "path": "/ask", "query_string": b"", "root_path": "",
+                "headers": [(b"content-type", b"application/json"), (b"cookie", cookies[i % len(cookies)].encode())],
+                "server": ("localhost", 80), "scheme": "http", "http_version": "1.1",
+            }
+            sent = []
+
+            async def receive():
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            async def send(message):
+                sent.append(message)
+
+            await asgi_app(scope, receive, send)
+            return sent[0]["status"]
+
+        async def client(c):
+            for r in range(per_client):
+                start = time.perf_counter()
+                status = await ask(c * per_client + r)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(status)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in range(concurrency)))
+        seconds = time.perf_counter() - start
+    return latencies, len(errors), seconds
+
+
+def run(args):
+    logging.getLogger().setLevel(logging.WARNING)  # Every query logs at INFO
+    server, base_url = start_server(dimension=args.dimension, latency=args.latency)
+    try:
+        app, cookies = build_app(base_url, args)
+        print(f"{'variant':>8} {'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        results = []
+        for concurrency in args.concurrency:
+            for variant in args.variants:
+                server.request_count = 0
+                if variant == "wsgi":
+                    latencies, errors, seconds = run_wsgi(app, cookies, concurrency, args)
+                else:
+                    latencies, errors, seconds = asyncio.run(run_asgi(app, cookies, concurrency, args, base_url))
+                row = summarise(variant, concurrency, latencies, errors, seconds, server)
+                results.append(row)
+                print(
+                    f"{variant:>8} {concurrency:>8} {row['requests']:>9} {errors:>7} "
+                    f"{row['requests_per_second']:>8.1f} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+                )
+    finally:
+        server.shutdown()
+    report = {"settings": {key: value for key, value in vars(args).items() if key != "output"}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 64, 256], help="Simultaneous clients.")
+    parser.add_argument("--requests", type=int, default=512, help="Queries per concurrency level and variant.")
+    parser.add_argument("--workers", type=int, default=8, help="Worker threads serving the WSGI variant.")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--latency", type=float, default=0.2, help="Average seconds per fake API request.")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--segments", type=int, default=200, help="Transcript segments per session.")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--retrieval-mode", default="vector", help="RETRIEVAL_MODE for the app.")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path.")
+    args = parser.parse_args()
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
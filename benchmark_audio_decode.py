@@ -0,0 +1,101 @@
+"""
+Compare the two ways Transcribe can get at a video's audio track:
+
+  * file:      moviepy writes the track to a temporary MP3, which is then decoded again
+  * in-memory: PyAV decodes the track straight to a 16 kHz mono float32 array
+
+Reports wall time, bytes written to disk and the decoded length for each path:
+
+    python benchmark_audio_decode.py --video sample.mp4 --repeats 3
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import time
+
+from transcribe import Transcribe
+
+
+def disk_blocks():
+    """
+    Blocks read and written (512-byte units on Linux) by this process and its waited-for children.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)  # moviepy runs ffmpeg as a child process
+    return own.ru_inblock + children.ru_inblock, own.ru_oublock + children.ru_oublock
+
+
+def time_path(decode, repeats):
+    """
+    Run `decode` `repeats` times; returns the best time plus the samples, temporary file bytes and
+    disk blocks of the last run.
+    """
+    best = None
+    for _ in range(repeats):
+        blocks_before = disk_blocks()
+        start = time.perf_counter()
+        audio, temp_bytes = decode()
+        seconds = time.perf_counter() - start
+        blocks_after = disk_blocks()
+        best = seconds if best is None else min(best, seconds)
+    read_blocks, write_blocks = (after - before for before, after in zip(blocks_before, blocks_after))
+    return {
+        "seconds": best,
+        "samples": len(audio),
+        "temp_file_bytes": temp_bytes,
+        "blocks_read": read_blocks,
+        "blocks_written": write_blocks,
+    }
+
+
+def run(args):
+    transcriber = Transcribe(args.video)
+
+    def via_file():
+        path = transcriber.extract_audio_from_video()
+        if not path:
+            raise SystemExit("moviepy could not extract the audio track.")
+        try:
+            return Transcribe(path).load_audio(), os.path.getsize(path)  # Whisper decodes the MP3 the same way
+        finally:
+            os.remove(path)
+
+    def in_memory():
+        return transcriber.load_audio(), 0
+
+    results = {
+        "video": args.video,
+        "file": time_path(via_file, args.repeats),
+        "in_memory": time_path(in_memory, args.repeats),
+    }
+    file_result, memory_result = results["file"], results["in_memory"]
+    print(f"{'path':>10} {'seconds':>9} {'audio s':>8} {'temp MB':>8} {'blk read':>9} {'blk written':>12}")
+    for name, result in (("file", file_result), ("in-memory", memory_result)):
+        print(
+            f"{name:>10} {result['seconds']:>9.3f} {result['samples'] / 16000:>8.1f} "
+            f"{result['temp_file_bytes'] / 1e6:>8.2f} {result['blocks_read']:>9} {result['blocks_written']:>12}"
+        )
+    print(
+        f"In-memory decode is {file_result['seconds'] / memory_result['seconds']:.1f}x faster and avoids "
+        f"{file_result['temp_file_bytes'] / 1e6:.2f} MB of temporary writes."
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True, help="Sample MP4 to decode.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Scaling benchmark for EmbeddingStorage.
+
+For each corpus size, builds a store with every search backend from synthetic,
+deterministic embeddings (no network: the store's OpenAI client is replaced by an
+in-process fake) and measures ingest throughput, query p50/p99 latency, memory per
+segment (vector data held by the store, plus process RSS growth as a rough total) and
+recall@k against exact float32 search. Results are printed as a table and
+can be written as JSON so runs on different commits can be compared:
+
+    python benchmark_retrieval.py --sizes 1000 10000 100000 --output results.json
+    python benchmark_retrieval.py --sizes 1000 10000 100000 --baseline results.json
+
+Backends: exact, ivf (one entry per --nprobe), int8, pq, int8/pq with full-precision
+re-ranking, keyword (BM25) and hybrid (vector + BM25). Keyword results are compared with
+exact vector search like the others, so their recall measures agreement, not quality.
+
+The embedding function is pluggable with `--embedding-function module:callable`, any
+callable taking (text, dimension) and returning a vector, e.g.
+`fake_openai_server:fake_embedding`. The default draws clustered vectors so that
+approximate backends face realistic topic structure.
+
+A float32 store takes `dimension * 4` bytes per segment, so 1M segments at 1536
+dimensions need about 6 GB per float backend; use a smaller --dimension for that size.
+"""
+import argparse
+import gc
+import hashlib
+import importlib
+import json
+import logging
+import math
+import os
+import platform
+import re
+import subprocess
+import time
+from types import SimpleNamespace
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # EmbeddingStorage refuses to start without one
+
+from EmbeddingStorage import EmbeddingStorage
+from ann_index import IVFIndex
+from bm25_index import BM25Index
+from quantization import ProductQuantizer, ScalarQuantizer
+
+BACKENDS = ("exact", "ivf", "int8", "int8-rerank", "pq", "pq-rerank", "keyword", "hybrid")
+TOPIC_WORDS = [
+    "budget", "deadline", "hiring", "launch", "pricing", "security", "roadmap", "churn",
+    "latency", "onboarding", "compliance", "migration", "revenue", "support", "design", "testing",
+]
+
+
+class ClusteredEmbedding:
+    """
+    Default fake embedding: the centre of the text's topic plus noise seeded from the text,
+    so the same text always gets the same vector and same-topic texts lie close together.
+    """
+
+    def __init__(self, clusters=200, seed=0, noise=1.5):
+        self.clusters = clusters
+        self.seed = seed
+        self.noise = noise
+        self.centres = {}  # dimension -> (clusters, dimension) centres
+
+    def __call__(self, text, dimension):
+        if dimension not in self.centres:
+            rng = np.random.default_rng(self.seed)
+            self.centres[dimension] = rng.normal(size=(self.clusters, dimension)).astype(np.float32)
+        match = re.search(r"topic (\d+)", text)
+        label = int(match.group(1)) % self.clusters if match else 0
+        text_seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        noise = np.random.default_rng(text_seed).normal(scale=self.noise, size=dimension).astype(np.float32)
+        return self.centres[dimension][label] + noise
+
+
+class FakeEmbeddingClient:
+    """
+    Stands in for `OpenAI()` in EmbeddingStorage: answers `embeddings.create` from `embed`.
+    Vectors are memoised so every backend ingests the same data without paying for generation.
+    """
+
+    def __init__(self, embed, dimension):
+        self.embed = embed
+        self.dimension = dimension
+        self.vectors = {}
+        self.embeddings = self  # client.embeddings.create(...)
+
+    def vector(self, text):
+        vector = self.vectors.get(text)
+        if vector is None:
+            vector = self.vectors[text] = np.asarray(self.embed(text, self.dimension), dtype=np.float32)
+        return vector
+
+    def create(self, input, model):
+        data = [SimpleNamespace(index=i, embedding=self.vector(text)) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data)
+
+
+def load_embedding_function(spec, clusters, seed):
+    if not spec:
+        return ClusteredEmbedding(clusters, seed)
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def synthetic_corpus(count, clusters, seed):
+    """
+    Transcript-like segments: each names its topic (driving the default embedding) and a few
+    topic words (driving keyword search).
+    """
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, clusters, size=count)
+    words = rng.integers(0, len(TOPIC_WORDS), size=(count, 3))
+    return [
+        {"text": f"segment {i} topic {label} " + " ".join(TOPIC_WORDS[w] for w in row)}
+        for i, (label, row) in enumerate(zip(labels, words))
+    ]
+
+
+def synthetic_queries(count, clusters, seed):
+    rng = np.random.default_rng(seed + 1)
+    return [
+        f"question {i} topic {rng.integers(0, clusters)} {TOPIC_WORDS[rng.integers(0, len(TOPIC_WORDS))]}"
+        for i in range(count)
+    ]
+
+
+def rss_bytes():
+    """
+    Resident set size of this process, or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def backend_options(backend, size, args):
+    n_lists = args.n_lists or max(1, min(4096, int(4 * math.sqrt(size))))
+    codec_train_size = min(size, 4096)
+    pq = lambda: ProductQuantizer(subspaces=args.pq_subspaces)  # noqa: E731
+    return {
+        "exact": {},
+        "ivf": {"index_factory": lambda: IVFIndex(
+            n_lists=n_lists, nprobe=min(args.nprobe), train_size=min(n_lists * 39, size)  # Train even on small corpora
+        )},
+        "int8": {"codec_factory": ScalarQuantizer, "codec_train_size": codec_train_size},
+        "int8-rerank": {"codec_factory": ScalarQuantizer, "codec_train_size": codec_train_size, "rerank": args.rerank},
+        "pq": {"codec_factory": pq, "codec_train_size": codec_train_size},
+        "pq-rerank": {"codec_factory": pq, "codec_train_size": codec_train_size, "rerank": args.rerank},
+        "keyword": {"keyword_index_factory": BM25Index},
+        "hybrid": {"keyword_index_factory": BM25Index},
+    }[backend]
+
+
+def ingest(segments, client, args, **options):
+    """
+    Build a store through the normal ingestion path; returns (storage, seconds, RSS growth in bytes).
+    """
+    gc.collect()
+    before = rss_bytes()
+    storage = EmbeddingStorage(
+        initial_capacity=len(segments), client=client, max_batch_size=args.batch_size, max_retries=0, **options
+    )
+    start = time.perf_counter()
+    storage.store_transcription(segments)
+    seconds = time.perf_counter() - start
+    after = rss_bytes()
+    return storage, seconds, (after - before) if before is not None else None
+
+
+def measure(queries, search):
+    """
+    Run `search` for every query; returns (result ID sets, latencies in ms).
+    """
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append({segment_id for segment_id, _, _ in search(query)})
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def recall(results, truth):
+    return float(np.mean([len(r & t) / len(t) for r, t in zip(results, truth) if t]))
+
+
+def summarise(size, backend, recall_at_k, latencies_ms, ingest_seconds, storage, rss_growth):
+    collection = storage.collection()
+    return {
+        "segments": size,
+        "backend": backend,
+        "recall_at_k": recall_at_k,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "ingest_seconds": ingest_seconds,
+        "ingest_per_second": size / ingest_seconds if ingest_seconds else None,
+        "vector_bytes_per_segment": collection.memory_bytes / size,
+        "rss_bytes_per_segment": rss_growth / size if rss_growth is not None else None,
+    }
+
+
+def print_row(row, baseline=None):
+    rss = row["rss_bytes_per_segment"]
+    line = (
+        f"{row['segments']:>9} {row['backend']:>16} {row['recall_at_k']:>8.3f} {row['p50_ms']:>8.3f} "
+        f"{row['p99_ms']:>8.3f} {row['ingest_per_second'] or 0:>10.0f} {row['vector_bytes_per_segment']:>8.0f} "
+        f"{rss if rss is not None else float('nan'):>8.0f}"
+    )
+    if baseline:
+        line += (
+            f"   p50 x{row['p50_ms'] / baseline['p50_ms']:.2f}"
+            f" recall {row['recall_at_k'] - baseline['recall_at_k']:+.3f}"
+            f" ingest x{(row['ingest_per_second'] or 0) / (baseline['ingest_per_second'] or 1):.2f}"
+        )
+    print(line)
+
+
+def run_size(size, embed, args, baseline):
+    """
+    Benchmark every requested backend at one corpus size; returns the result rows.
+    """
+    segments = synthetic_corpus(size, args.clusters, args.seed)
+    query_texts = synthetic_queries(args.queries, args.clusters, args.seed)
+    client = FakeEmbeddingClient(embed, args.dimension)
+    for text in [segment["text"] for segment in segments] + query_texts:
+        client.vector(text)  # Generate up front so ingest timings measure the store, not the fake
+    query_vectors = [client.vector(text) for text in query_texts]
+
+    rows = []
+    exact = None
+    for backend in ["exact"] + [name for name in args.backends if name != "exact"]:
+        storage, seconds, rss_growth = ingest(segments, client, args, **backend_options(backend, size, args))
+        collection = storage.collection()
+        if backend == "exact":
+            exact, latencies = measure(query_vectors, lambda q: collection.search(q, args.top_k, approximate=False))
+            runs = [("exact", exact, latencies)] if "exact" in args.backends else []
+        elif backend == "ivf":
+            runs = []
+            for nprobe in sorted(args.nprobe):
+                collection.index.nprobe = nprobe
+                results, latencies = measure(query_vectors, lambda q: collection.search(q, args.top_k, approximate=True))
+                runs.append((f"ivf nprobe={nprobe}", results, latencies))
+        elif backend == "keyword":
+            results, latencies = measure(query_texts, lambda q: collection.keyword_search(q, args.top_k))
+            runs = [(backend, results, latencies)]
+        elif backend == "hybrid":
+            pairs = list(zip(query_texts, query_vectors))
+            results, latencies = measure(pairs, lambda p: collection.hybrid_search(p[0], p[1], args.top_k))
+            runs = [(backend, results, latencies)]
+        else:
+            results, latencies = measure(query_vectors, lambda q: collection.search(q, args.top_k))
+            runs = [(backend, results, latencies)]
+        for name, results, latencies in runs:
+            row = summarise(size, name, recall(results, exact), latencies, seconds, storage, rss_growth)
+            print_row(row, baseline.get((size, name)))
+            rows.append(row)
+        del storage, collection
+    return rows
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    logging.getLogger().setLevel(logging.WARNING)  # The store logs every batch at DEBUG
+    embed = load_embedding_function(args.embedding_function, args.clusters, args.seed)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {(row["segments"], row["backend"]): row for row in json.load(f)["results"]}
+
+    print(
+        f"{'segments':>9} {'backend':>16} {'recall@' + str(args.top_k):>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'ingest/s':>10} {'vec B/seg':>8} {'rss B/seg':>8}"
+    )
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, embed, args, baseline))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256, help="Segments per fake embeddings request.")
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF lists; defaults to 4 * sqrt(segments).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--pq-subspaces", type=int, default=96)
+    parser.add_argument("--rerank", type=int, default=4, help="Re-ranking factor for the *-rerank backends.")
+    parser.add_argument("--embedding-function", default=None,
+                        help="module:callable taking (text, dimension); defaults to clustered synthetic vectors.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path.")
+    parser.add_argument("--baseline", default=None, help="JSON from an earlier run to print relative changes against.")
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="Exit non-zero if IVF recall at the largest nprobe and size falls below this value.")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.min_recall is not None:
+        largest = max(args.sizes)
+        name = f"ivf nprobe={max(args.nprobe)}"
+        for row in report["results"]:
+            if row["segments"] == largest and row["backend"] == name and row["recall_at_k"] < args.min_recall:
+                raise SystemExit(f"Recall {row['recall_at_k']:.3f} below required {args.min_recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
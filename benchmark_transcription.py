@@ -0,0 +1,124 @@
+"""
+Speed-vs-accuracy benchmark for the Whisper transcription profiles in transcribe.py.
+
+Transcribes the same audio with each profile and reports model load time, real-time
+factor (processing seconds per second of audio; below 1 is faster than real time) and
+word error rate. WER is measured against the float32 profile's transcript and, when a
+reference transcript is given, against that too, with the change relative to float32:
+
+    python benchmark_transcription.py --audio sample.wav --reference sample.txt \
+        --profiles cpu-float32 cpu-int8 cpu-int8-float32
+"""
+import argparse
+import json
+import logging
+import re
+import time
+
+from transcribe import TRANSCRIPTION_PROFILES, profile_settings
+from whisper_pool import WhisperModelRegistry
+
+
+def words(text):
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level Levenshtein distance between two texts divided by the reference length.
+    """
+    reference, hypothesis = words(reference), words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def benchmark_profile(registry, model_size_or_path, profile, audio, repeats, beam_size):
+    """
+    Load and run one profile; returns a result dict including the transcript of the last run.
+    """
+    device, compute_type, options = profile_settings(profile)
+    start = time.perf_counter()
+    registry.warm_up(model_size_or_path, device, compute_type, **options)
+    load_seconds = time.perf_counter() - start
+    pool = registry.pool(model_size_or_path, device, compute_type, **options)
+
+    timings = []
+    for _ in range(repeats):
+        with pool.acquire() as model:
+            start = time.perf_counter()
+            segments, info = model.transcribe(audio, beam_size=beam_size)
+            text = " ".join(segment.text.strip() for segment in segments)  # Decoding happens while iterating
+            timings.append(time.perf_counter() - start)
+    seconds = min(timings)  # Best of the repeats, to discount one-off warm-up effects
+    return {
+        "profile": profile,
+        "device": device,
+        "compute_type": compute_type,
+        "load_seconds": load_seconds,
+        "audio_seconds": info.duration,
+        "transcribe_seconds": seconds,
+        "real_time_factor": seconds / info.duration if info.duration else None,
+        "transcript": text,
+    }
+
+
+def run(args):
+    registry = WhisperModelRegistry()
+    reference = None
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = f.read()
+
+    results = [
+        benchmark_profile(registry, args.model, profile, args.audio, args.repeats, args.beam_size)
+        for profile in args.profiles
+    ]
+    baseline = next((r for r in results if r["profile"] == args.baseline), results[0])
+    for result in results:
+        result["wer_vs_baseline"] = word_error_rate(baseline["transcript"], result["transcript"])
+        result["speedup_vs_baseline"] = baseline["transcribe_seconds"] / result["transcribe_seconds"]
+        if reference is not None:
+            result["wer_vs_reference"] = word_error_rate(reference, result["transcript"])
+    if reference is not None:
+        for result in results:
+            result["wer_delta_vs_baseline"] = result["wer_vs_reference"] - baseline["wer_vs_reference"]
+
+    print(f"Audio: {args.audio} ({baseline['audio_seconds']:.1f}s), model {args.model}, baseline {baseline['profile']}")
+    print(f"{'profile':>18} {'load s':>8} {'RTF':>8} {'speedup':>8} {'WER/base':>9} {'WER/ref':>8} {'delta':>8}")
+    for result in results:
+        ref = f"{result['wer_vs_reference']:>8.3f} {result['wer_delta_vs_baseline']:>+8.3f}" if reference else ""
+        print(
+            f"{result['profile']:>18} {result['load_seconds']:>8.2f} {result['real_time_factor']:>8.3f} "
+            f"{result['speedup_vs_baseline']:>7.2f}x {result['wer_vs_baseline']:>9.3f} {ref}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "audio": args.audio, "results": results}, f, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="Audio file to transcribe with every profile.")
+    parser.add_argument("--reference", default=None, help="Text file with the correct transcript, for absolute WER.")
+    parser.add_argument("--model", default="base", help="Whisper model size or path.")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(TRANSCRIPTION_PROFILES),
+                        default=["cpu-float32", "cpu-int8", "cpu-int8-float32"])
+    parser.add_argument("--baseline", default="cpu-float32", help="Profile the others are compared with.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--beam-size", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
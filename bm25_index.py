@@ -0,0 +1,106 @@
+import math
+import re
+from collections import defaultdict
+import numpy as np
+
+from ann_index import select_top_k
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have how i in is it its of on or so "
+    "that the their them then there these they this to was we were what when where which who why "
+    "will with you your".split()
+)
+
+
+def tokenize(text):
+    """
+    Lower-case word tokens with stopwords removed. Numbers, names and acronyms survive
+    as their own tokens, which is what keyword search is for.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=60):
+    """
+    Fuse several best-first position lists: each position scores sum(weight / (k + rank)).
+    Returns (positions, fused scores) in no particular order; pass them to `select_top_k`.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, position in enumerate(ranking):
+            fused[int(position)] += weight / (k + rank + 1)
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    positions = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    return positions, scores
+
+
+class BM25Index:
+    """
+    In-process inverted index scoring row positions with Okapi BM25. Rows are added
+    incrementally alongside their embeddings; a query touches only the postings of its terms.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(lambda: ([], []))  # term -> (positions, term frequencies)
+        self.doc_lengths = np.zeros(1024, dtype=np.float32)
+        self.count = 0  # Number of rows indexed
+        self.total_length = 0
+
+    def __len__(self):
+        return self.count
+
+    def reset(self):
+        self.__init__(self.k1, self.b)
+
+    def add(self, position, text):
+        """
+        Index `text` under row `position`; positions must be added in increasing order.
+        """
+        tokens = tokenize(text)
+        if position >= len(self.doc_lengths):
+            grown = np.zeros(max(2 * len(self.doc_lengths), position + 1), dtype=np.float32)
+            grown[: len(self.doc_lengths)] = self.doc_lengths
+            self.doc_lengths = grown
+        self.doc_lengths[position] = len(tokens)
+        self.count = max(self.count, position + 1)
+        self.total_length += len(tokens)
+        frequencies = defaultdict(int)
+        for token in tokens:
+            frequencies[token] += 1
+        for token, frequency in frequencies.items():
+            positions, tfs = self.postings[token]
+            positions.append(position)
+            tfs.append(frequency)
+
+    def search(self, query, top_k):
+        """
+        Return (positions, scores, matched) for the best `top_k` rows, best first; `matched`
+        counts how many distinct query terms each returned row contains.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.postings]
+        if not terms or self.count == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, np.empty(0, dtype=np.float32), empty
+        average_length = self.total_length / self.count or 1.0
+        all_positions, contributions = [], []
+        for term in terms:
+            positions, tfs = self.postings[term]
+            positions = np.asarray(positions, dtype=np.int64)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf = math.log(1 + (self.count - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[positions] / average_length)
+            all_positions.append(positions)
+            contributions.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        candidates, inverse = np.unique(np.concatenate(all_positions), return_inverse=True)
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        matched = np.zeros(len(candidates), dtype=np.int64)
+        np.add.at(scores, inverse, np.concatenate(contributions))
+        np.add.at(matched, inverse, 1)
+        top_positions, top_scores = select_top_k(scores, top_k, candidates)
+        return top_positions, top_scores, matched[np.searchsorted(candidates, top_positions)]
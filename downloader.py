@@ -0,0 +1,187 @@
+"""
+HTTP downloads for media URLs.
+
+A `Downloader` keeps one `requests.Session` whose connection pool is reused across files and
+threads. Files served with `Accept-Ranges: bytes` and a known length are split into byte
+ranges fetched in parallel into a preallocated file; anything else is streamed in one
+request. Either way a failed request is retried from the last byte written (with a `Range`
+header) rather than from the start, and data is read in chunks of `chunk_bytes` (1 MiB).
+`Downloader.iter_content` streams a body in order for consumers that start on it right away.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_BYTES = 1 << 20  # Read size per iteration of a response body
+MIN_PART_BYTES = 8 << 20  # Smallest range worth its own request
+
+
+class DownloadError(IOError):
+    """
+    Raised when a download cannot be completed within the allowed retries.
+    """
+
+
+def make_session(pool_size=8):
+    """
+    A Session whose HTTP(S) connection pool holds `pool_size` connections per host.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class Downloader:
+    """
+    Parallel, resumable downloader. `workers` ranges of at least `min_part_bytes` are fetched
+    at once. A request that fails is resumed where it stopped; a range is given up after
+    `max_retries` consecutive attempts that received no data, with exponential backoff between them.
+    """
+
+    def __init__(self, session=None, workers=4, chunk_bytes=CHUNK_BYTES, min_part_bytes=MIN_PART_BYTES,
+                 max_retries=3, retry_backoff=1.0, timeout=(10, 60)):
+        self.workers = workers
+        self.session = session or make_session(pool_size=max(workers, 1) * 2)
+        self.chunk_bytes = chunk_bytes
+        self.min_part_bytes = min_part_bytes
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout  # (connect, read) seconds per request
+
+    def probe(self, url):
+        """
+        Return (size, accepts_ranges) for `url`; size is None when the server does not say.
+        """
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.debug("HEAD %s failed (%s); downloading without ranges.", url, e)
+            return None, False
+        size = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        if response.headers.get("Content-Encoding"):
+            return None, False  # Lengths and ranges then refer to the encoded body
+        return (int(size) if size and size.isdigit() else None), accepts_ranges
+
+    def download(self, url, path):
+        """
+        Download `url` to `path` and return the number of bytes written. Raises DownloadError.
+        """
+        start_time = time.perf_counter()
+        size, accepts_ranges = self.probe(url)
+        if accepts_ranges and size and self.workers > 1 and size >= 2 * self.min_part_bytes:
+            written = self._download_ranges(url, path, size)
+        else:
+            with open(path, "wb"):
+                pass
+            written = self._fetch(url, path, 0, None if size is None else size - 1, resumable=accepts_ranges)
+        seconds = time.perf_counter() - start_time
+        logging.info(
+            "Downloaded %d bytes in %.1fs (%.1f MB/s).", written, seconds, written / 1e6 / max(seconds, 1e-9)
+        )
+        return written
+
+    def _download_ranges(self, url, path, size):
+        parts = min(self.workers * 4, max(2, size // self.min_part_bytes))  # Spare parts even out slow ranges
+        bounds = [size * i // parts for i in range(parts + 1)]
+        with open(path, "wb") as f:
+            f.truncate(size)  # Preallocate so every part can write at its own offset
+        logging.info("Downloading %d bytes in %d ranges on %d connections.", size, parts, self.workers)
+        failed = threading.Event()  # One part out of retries makes the others stop early
+
+        def fetch_part(start, end):
+            if failed.is_set():
+                return 0
+            try:
+                return self._fetch(url, path, start, end, resumable=True, whole=False)
+            except DownloadError:
+                failed.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as executor:
+            futures = [executor.submit(fetch_part, bounds[i], bounds[i + 1] - 1) for i in range(parts)]
+            return sum(future.result() for future in futures)
+
+    def _fetch(self, url, path, start, end, resumable, whole=True):
+        """
+        Write bytes [start, end] (end inclusive; None for "to the end") of `url` into `path` at
+        offset `start`, resuming after the last byte written when a request fails. `whole` means
+        the range is the entire file, so a server ignoring the Range header can simply restart it.
+        """
+        written, attempt = 0, 0
+        while True:
+            position = start + written
+            headers = {}
+            if resumable and (position or end is not None):
+                headers["Range"] = f"bytes={position}-{'' if end is None else end}"
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206 and (position or not whole):
+                        if not whole:
+                            raise DownloadError(f"Server ignored the range request for {url}.")
+                        written = position = 0  # Whole-file response: start over
+                    with open(path, "r+b") as f:
+                        f.seek(position)
+                        if end is None:
+                            f.truncate()  # Drop a partial tail before it is written again
+                        for chunk in response.iter_content(chunk_size=self.chunk_bytes):
+                            f.write(chunk)
+                            written += len(chunk)
+            except requests.RequestException as e:
+                error = e
+            else:
+                if end is None or written >= end - start + 1:
+                    return written
+                error = DownloadError(f"Connection closed after {written} of {end - start + 1} bytes.")
+            attempt = self._next_attempt(url, attempt, start + written > position, start + written, error)
+
+    def iter_content(self, url):
+        """
+        Yield the body of `url` in chunks as it arrives, for consumers that process it on the fly.
+        A dropped connection is resumed with a Range request when the server supports them;
+        otherwise, since the bytes already yielded cannot be taken back, DownloadError is raised.
+        """
+        size, accepts_ranges = self.probe(url)
+        received, attempt = 0, 0
+        while True:
+            position = received
+            headers = {"Range": f"bytes={received}-"} if received else {}
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if received and response.status_code != 206:
+                        raise DownloadError(f"Cannot resume {url} at byte {received}: ranges are not supported.")
+                    for chunk in response.iter_content(chunk_size=self.chunk_bytes):
+                        received += len(chunk)
+                        yield chunk
+            except requests.RequestException as e:
+                if not accepts_ranges:
+                    raise DownloadError(f"Download of {url} failed at byte {received}: {e}") from e
+                error = e
+            else:
+                if size is None or received >= size:
+                    return
+                error = DownloadError(f"Connection closed after {received} of {size} bytes.")
+            attempt = self._next_attempt(url, attempt, received > position, received, error)
+
+    def _next_attempt(self, url, attempt, progressed, position, error):
+        """
+        Decide on a retry after `error`: returns the new attempt count after backing off, or raises
+        DownloadError. Only consecutive attempts that received no data count towards `max_retries`.
+        """
+        if progressed:
+            attempt = 0
+        elif attempt >= self.max_retries:
+            raise DownloadError(f"Giving up on {url} after {attempt + 1} attempts: {error}") from error
+        else:
+            attempt += 1
+        logging.warning("Download of %s failed at byte %d (retry %d): %s", url, position, attempt, error)
+        time.sleep(self.retry_backoff * 2 ** attempt)
+        return attempt
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+
+def normalise_text(text):
+    """
+    Normalise text before hashing so trivially different copies (Unicode composition,
+    runs of whitespace, surrounding blanks) share one cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model, text):
+    """
+    Content address of an embedding: SHA-256 over the model name and the normalised text.
+    """
+    return hashlib.sha256(f"{model}\0{normalise_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed on (model, normalised-text hash).
+
+    The first tier is a bounded in-memory LRU; the optional second tier is a SQLite
+    database of float32 blobs that survives restarts and can be shared by workers.
+    """
+
+    def __init__(self, max_entries=10000, path=None):
+        self.max_entries = max_entries  # Capacity of the in-memory LRU tier
+        self.path = path  # SQLite file for the on-disk tier, or None for memory only
+        self.memory = OrderedDict()  # key -> float32 vector, least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0  # Lookups answered by either tier
+        self.disk_hits = 0  # Subset of hits answered by the on-disk tier
+        self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")  # Concurrent readers while a worker writes
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, vector BLOB)"
+            )
+            self.db.commit()
+        logging.debug("EmbeddingCache initialized (max_entries=%d, path=%s).", max_entries, path)
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, model, text):
+        """
+        Return the cached vector for `text` under `model`, or None on a miss.
+        """
+        key = cache_key(model, text)
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self.db is not None:
+                row = self.db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, model, text, vector):
+        """
+        Store a vector in both tiers.
+        """
+        self.put_many(model, [(text, vector)])
+
+    def put_many(self, model, items):
+        """
+        Store several (text, vector) pairs, writing the on-disk tier in one transaction.
+        """
+        rows = []
+        with self.lock:
+            for text, vector in items:
+                key = cache_key(model, text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model, vector.tobytes()))
+            if self.db is not None and rows:
+                self.db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+                self.db.commit()
+
+    def stats(self):
+        """
+        Hit/miss counters for monitoring.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+            }
@@ -0,0 +1,143 @@
+"""
+On-disk layout for EmbeddingStorage.
+
+A store directory holds append-only segments plus a manifest listing them in order:
+
+    manifest.json                 {"dimension": 1536, "next_id": 1200, "segments": [{"name": ..., "rows": ...}]}
+    segment-000000.vectors.npy    (rows, dimension) float32, L2-normalised
+    segment-000000.ids.npy        (rows,) int64
+    segment-000000.offsets.npy    (rows + 1,) int64 byte offsets into the text blob
+    segment-000000.text           UTF-8 texts, concatenated
+
+Segments are never rewritten; saving new rows adds a segment and atomically replaces
+the manifest. Segments are loaded with read-only memory maps, so every worker process
+that opens the same directory shares one copy of the data through the page cache.
+"""
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = "manifest.lock"
+
+
+def empty_manifest():
+    return {"dimension": None, "next_id": 0, "segments": []}
+
+
+def read_manifest(directory):
+    """
+    Read the manifest of a store directory, or an empty one if nothing has been saved yet.
+    """
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return empty_manifest()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """
+    Atomically replace the manifest so readers never observe a partial file.
+    """
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def manifest_mtime(directory):
+    """
+    Modification time of the manifest in nanoseconds, or None if it does not exist.
+    """
+    try:
+        return os.stat(os.path.join(directory, MANIFEST_NAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@contextlib.contextmanager
+def manifest_lock(directory):
+    """
+    Exclusive inter-process lock held while appending a segment and updating the manifest.
+    """
+    with open(os.path.join(directory, LOCK_NAME), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def write_segment(directory, name, vectors, ids, texts):
+    """
+    Write one immutable segment. Must be called before the manifest references it.
+    """
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(blob) for blob in encoded])
+    base = os.path.join(directory, name)
+    np.save(f"{base}.vectors.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+    np.save(f"{base}.ids.npy", np.asarray(ids, dtype=np.int64))
+    np.save(f"{base}.offsets.npy", offsets)
+    with open(f"{base}.text", "wb") as f:
+        f.write(b"".join(encoded))
+    logging.info("Wrote embedding segment %s with %d rows.", name, len(encoded))
+
+
+class PersistedSegment:
+    """
+    A read-only, memory-mapped view of one segment on disk.
+    """
+
+    def __init__(self, directory, name):
+        base = os.path.join(directory, name)
+        self.name = name
+        self.vectors = np.load(f"{base}.vectors.npy", mmap_mode="r")
+        self.ids = np.load(f"{base}.ids.npy", mmap_mode="r")
+        self.offsets = np.load(f"{base}.offsets.npy", mmap_mode="r")
+        if self.offsets[-1] > 0:
+            self.text = np.memmap(f"{base}.text", dtype=np.uint8, mode="r")
+        else:
+            self.text = np.empty(0, dtype=np.uint8)  # Empty files cannot be memory-mapped
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def text_at(self, row):
+        return self.text[self.offsets[row]: self.offsets[row + 1]].tobytes().decode("utf-8")
+
+
+class SegmentedMatrix:
+    """
+    Presents several row blocks (persisted segments and the live in-memory buffer) as one
+    matrix for the operations search needs: `matrix @ query` and `matrix[positions]`.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = [block for block in blocks if len(block)]
+        self.starts = np.cumsum([0] + [len(block) for block in self.blocks])
+        self.shape = (int(self.starts[-1]), self.blocks[0].shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __matmul__(self, query):
+        return np.concatenate([block @ query for block in self.blocks])
+
+    def __getitem__(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        scalar = positions.ndim == 0
+        positions = np.atleast_1d(positions)
+        block_ids = np.searchsorted(self.starts, positions, side="right") - 1
+        rows = np.empty((len(positions), self.shape[1]), dtype=np.float32)
+        for block_id in np.unique(block_ids):
+            mask = block_ids == block_id
+            rows[mask] = self.blocks[block_id][positions[mask] - self.starts[block_id]]
+        return rows[0] if scalar else rows
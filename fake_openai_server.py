@@ -0,0 +1,158 @@
+"""
+A local stand-in for the OpenAI HTTP API, used to exercise the embedding pipeline and
+'/ask' without network access or API costs.
+
+Point an OpenAI client at it with `OpenAI(api_key="fake", base_url=base_url)`:
+
+    server, base_url = start_server(dimension=1536)
+    ...
+    server.shutdown()
+
+or run it standalone: `python fake_openai_server.py --port 8765`.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+def fake_embedding(text, dimension=1536):
+    """
+    Deterministic pseudo-embedding for `text`: the same text always maps to the same unit vector.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Serves `POST /v1/embeddings` with deterministic vectors and `POST /v1/chat/completions`
+    with a canned answer echoing the last user message. Behaviour is configured through
+    attributes on the server object (see `start_server`).
+    """
+
+    def log_message(self, format, *args):
+        logging.debug("Fake OpenAI server: " + format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.request_count += 1
+        if self.server.latency:
+            # Simulate network and model time; jitter keeps concurrent responses out of order
+            time.sleep(self.server.latency * random.uniform(0.5, 1.5))
+
+        if self.path.rstrip("/").endswith("/embeddings"):
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self.server.batch_sizes.append(len(inputs))
+            if any(self.server.reject_on and self.server.reject_on in text for text in inputs):
+                self._send_json(400, {"error": {"message": "Injected rejection", "type": "invalid_request_error"}})
+                return
+            if any(self.server.fail_on and self.server.fail_on in text for text in inputs) or (
+                random.random() < self.server.failure_rate
+            ):
+                self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                return
+            data = [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.server.dimension).tolist()}
+                for i, text in enumerate(inputs)
+            ]
+            tokens = sum(len(text.split()) for text in inputs)
+            self._send_json(200, {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model", "text-embedding-ada-002"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            messages = payload.get("messages", [])
+            self.server.chat_count += 1
+            text = "\n".join(str(message.get("content", "")) for message in messages)
+            if (self.server.fail_on and self.server.fail_on in text) or random.random() < self.server.failure_rate:
+                self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                return
+            question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+            contexts = sum(1 for m in messages if m.get("role") == "system") - 1  # Beyond the base prompt
+            answer = f"Fake answer to '{question}' using {max(contexts, 0)} context message(s)."
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+            completion_tokens = len(answer.split())
+            self._send_json(200, {
+                "id": f"chatcmpl-{self.server.chat_count}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-3.5-turbo"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+
+def start_server(host="127.0.0.1", port=0, dimension=1536, fail_on=None, failure_rate=0.0, latency=0.0,
+                 reject_on=None):
+    """
+    Start the fake server on a background thread and return (server, base_url).
+    `fail_on` makes any request containing that substring fail with HTTP 500 (a transient
+    error); `reject_on` makes embeddings requests containing it fail with HTTP 400 (a bad input);
+    `failure_rate` fails that fraction of requests at random; `latency` adds an average
+    delay in seconds to every request.
+    """
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.dimension = dimension
+    server.fail_on = fail_on
+    server.reject_on = reject_on
+    server.failure_rate = failure_rate
+    server.latency = latency
+    server.request_count = 0
+    server.chat_count = 0  # Chat completion requests among them
+    server.batch_sizes = []  # Number of inputs per embeddings request, for assertions on batching
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    logging.info("Fake OpenAI server listening on %s", base_url)
+    return server, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--fail-on", default=None)
+    parser.add_argument("--reject-on", default=None, help="Reject embeddings inputs containing this with HTTP 400.")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Average seconds of delay per request.")
+    args = parser.parse_args()
+    server, base_url = start_server(
+        args.host, args.port, args.dimension, args.fail_on, args.failure_rate, args.latency, args.reject_on
+    )
+    print(f"Serving fake OpenAI API at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,12 @@ import openai
 import logging
 import os
 import numpy as np
+from openai import AsyncOpenAI
+
+from EmbeddingStorage import DEFAULT_NAMESPACE
+
+# Sampling parameters shared by the blocking and async chat completion calls
+COMPLETION_OPTIONS = dict(temperature=0.7, max_tokens=150, top_p=1.0, frequency_penalty=0.0, presence_penalty=0.0)
 
 class GPTIntegration:
     """
@@ -31,12 +37,30 @@ class GPTIntegration:
             logging.info("OPENAI_API_KEY obtained successfully.")
         return api_key
 
-    def enrich_query_context(self, query):
+    def enrich_query_context(self, query, namespace=DEFAULT_NAMESPACE):
+        """
+        Adds context to a query by finding relevant text segments from the embedding storage,
+        searching only the given namespace (e.g. the caller's session).
+        """
+        logging.info("Enriching query context for: '%s'", query)
+        relevant_segments = self.embedding_storage.find_relevant_segments(query, namespace=namespace)
+        return self._format_context(relevant_segments)
+
+    async def enrich_query_context_async(self, query, namespace=DEFAULT_NAMESPACE, client=None):
         """
-        Adds context to a query by finding relevant text segments from the embedding storage.
+        Async counterpart of `enrich_query_context`; the query is embedded with `client`.
         """
         logging.info("Enriching query context for: '%s'", query)
-        relevant_segments = self.embedding_storage.find_relevant_segments(query)
+        relevant_segments = await self.embedding_storage.find_relevant_segments_async(
+            query, namespace=namespace, client=client
+        )
+        return self._format_context(relevant_segments)
+
+    @staticmethod
+    def _format_context(relevant_segments):
+        """
+        Join retrieved segments into a context string, returning (context, segments).
+        """
         if relevant_segments and all(isinstance(seg, dict) and "text" in seg for seg in relevant_segments):
             enriched_context = "\n".join([seg["text"] for seg in relevant_segments])
             logging.info("Context enriched with %d segments.", len(relevant_segments))
@@ -48,30 +72,16 @@ class GPTIntegration:
             )
             return "", []
 
-    def handle_query(self, conversation_history, query):
+    def handle_query(self, conversation_history, query, namespace=DEFAULT_NAMESPACE):
         """
         Handles the query by sending it to the OpenAI API with enriched context and returns the response.
         """
         client = openai.OpenAI(api_key=self.api_key)
         logging.info("Preparing to send query to OpenAI with context.")
-        enriched_context, metadata = self.enrich_query_context(query)
-        if enriched_context:
-            logging.info("Enriched context: %s", enriched_context)
-        else:
-            logging.info("No enriched context found, proceeding without it.")
-        messages = [{"role": "system", "content": "You are a helpful assistant."}]
-        if enriched_context:
-            messages.append({"role": "system", "content": enriched_context})
-        messages += [{"role": "user", "content": query}]
+        enriched_context, metadata = self.enrich_query_context(query, namespace)
         try:
             response = client.chat.completions.create(
-                model=self.engine_id,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=150,
-                top_p=1.0,
-                frequency_penalty=0.0,
-                presence_penalty=0.0,
+                model=self.engine_id, messages=self._build_messages(enriched_context, query), **COMPLETION_OPTIONS
             )
             logging.info("Query sent and response received from OpenAI.")
             return response.choices[0].message.content.strip(), metadata
@@ -79,6 +89,46 @@ class GPTIntegration:
             logging.error("Error fetching response from OpenAI: %s", e, exc_info=True)
             return "An error occurred while processing the request.", []
 
+    async def handle_query_async(self, conversation_history, query, namespace=DEFAULT_NAMESPACE, client=None):
+        """
+        Async counterpart of `handle_query`. Both the query embedding and the chat completion go
+        through `client`, an AsyncOpenAI client whose connection pool is shared by every query on
+        the same event loop; without one, a client is created for this call only.
+        """
+        logging.info("Preparing to send query to OpenAI with context.")
+        enriched_context, metadata = await self.enrich_query_context_async(query, namespace, client)
+        messages = self._build_messages(enriched_context, query)
+        try:
+            if client is not None:
+                response = await client.chat.completions.create(
+                    model=self.engine_id, messages=messages, **COMPLETION_OPTIONS
+                )
+            else:
+                async with AsyncOpenAI(api_key=self.api_key) as client:
+                    response = await client.chat.completions.create(
+                        model=self.engine_id, messages=messages, **COMPLETION_OPTIONS
+                    )
+            logging.info("Query sent and response received from OpenAI.")
+            return response.choices[0].message.content.strip(), metadata
+        except Exception as e:
+            logging.error("Error fetching response from OpenAI: %s", e, exc_info=True)
+            return "An error occurred while processing the request.", []
+
+    @staticmethod
+    def _build_messages(enriched_context, query):
+        """
+        The chat messages for `query`, with the retrieved context as a second system message.
+        """
+        if enriched_context:
+            logging.info("Enriched context: %s", enriched_context)
+        else:
+            logging.info("No enriched context found, proceeding without it.")
+        messages = [{"role": "system", "content": "You are a helpful assistant."}]
+        if enriched_context:
+            messages.append({"role": "system", "content": enriched_context})
+        messages += [{"role": "user", "content": query}]
+        return messages
+
     def test_api_connection(self):
         """
         Tests the OpenAI API connection by sending a simple prompt to ensure that the API key and network are functional.
@@ -0,0 +1,191 @@
+"""
+Opt-in timing of pipeline stages.
+
+Code wraps a stage in `with metrics.span("stage") as span:` and may attach counts with
+`span.set(bytes=..., segments=...)`; generators are timed with `metrics.iter_span`. While
+`metrics.enabled` is False, `span` returns a shared no-op object, so instrumented code pays
+one attribute check per stage. When enabled,
+each span is added to process-wide totals (exported in Prometheus text format by
+`metrics.prometheus`) and to the trace of the current request, if one was started with
+`metrics.trace()`.
+"""
+import contextlib
+import contextvars
+import re
+import threading
+import time
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **counts):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    One timed stage. Numeric values given to `set` are summed into per-stage counters.
+    """
+
+    def __init__(self, metrics, name, counts):
+        self.metrics = metrics
+        self.name = name
+        self.counts = counts
+        self.start = None
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        self.metrics.record(self, failed=exc_type is not None)
+        return False
+
+    def set(self, **counts):
+        self.counts.update(counts)
+
+
+class Trace:
+    """
+    The spans recorded during one request or job, in completion order.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": [
+                {"stage": span.name, "seconds": round(span.seconds, 6), "offset": round(span.start - self.started, 6),
+                 **span.counts}
+                for span in self.spans
+            ],
+        }
+
+
+class Metrics:
+    """
+    Process-wide stage totals: call count, failures, seconds and summed counts per stage name.
+    """
+
+    def __init__(self, enabled=False, prefix="pipeline"):
+        self.enabled = enabled
+        self.prefix = prefix  # Prometheus metric name prefix
+        self.stages = {}  # Stage name -> {"count", "failed", "seconds", counts...}
+        self.lock = threading.Lock()
+
+    def span(self, name, **counts):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, counts)
+
+    def iter_span(self, name, iterable, **counts):
+        """
+        Pass `iterable` through, timing only the time spent producing items (not the consumer's
+        time between them) and counting them as `items`. Closing the result closes `iterable`.
+        """
+        if not self.enabled:
+            return iterable
+        return self._iter_span(name, iterable, counts)
+
+    def _iter_span(self, name, iterable, counts):
+        span = Span(self, name, counts)
+        span.start, span.seconds = time.perf_counter(), 0.0
+        iterator, items, failed = iter(iterable), 0, False
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    span.seconds += time.perf_counter() - started
+                items += 1
+                yield item
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            span.set(items=items)
+            self.record(span, failed=failed)
+
+    @contextlib.contextmanager
+    def trace(self):
+        """
+        Collect the spans of this context (request or job) into a Trace; yields None when disabled.
+        Spans opened in other threads are not part of the trace, but still count towards the totals.
+        """
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def record(self, span, failed=False):
+        with self.lock:
+            totals = self.stages.setdefault(span.name, {"count": 0, "failed": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["failed"] += failed
+            totals["seconds"] += span.seconds
+            for key, value in span.counts.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(span)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+
+    def prometheus(self):
+        """
+        Render the totals in the Prometheus text exposition format.
+        """
+        with self.lock:
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+        seconds = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {seconds} Time spent in each pipeline stage.",
+            f"# TYPE {seconds} summary",
+        ]
+        for name, totals in sorted(stages.items()):
+            lines.append(f'{seconds}_sum{{stage="{name}"}} {totals["seconds"]:.6f}')
+            lines.append(f'{seconds}_count{{stage="{name}"}} {totals["count"]}')
+        failures = f"{self.prefix}_stage_failures_total"
+        lines += [f"# HELP {failures} Stage runs that raised.", f"# TYPE {failures} counter"]
+        for name, totals in sorted(stages.items()):
+            lines.append(f'{failures}{{stage="{name}"}} {totals["failed"]}')
+        counters = sorted({key for totals in stages.values() for key in totals} - {"count", "failed", "seconds"})
+        for key in counters:
+            metric = f"{self.prefix}_stage_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}_total"
+            lines += [f"# HELP {metric} Sum of '{key}' reported by each stage.", f"# TYPE {metric} counter"]
+            for name, totals in sorted(stages.items()):
+                if key in totals:
+                    lines.append(f'{metric}{{stage="{name}"}} {totals[key]}')
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the web app, Transcribe and EmbeddingStorage; enabled by initialize_components
+metrics = Metrics()
@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job's work function when the job has been cancelled.
+    """
+
+
+class JobQueueFull(RuntimeError):
+    """
+    Raised by `JobManager.submit` when too many jobs are already waiting.
+    """
+
+
+class Job:
+    """
+    State of one background job, updated by its work function and read by status requests.
+    """
+
+    def __init__(self, owner=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner  # Whoever may see the job, e.g. a session ID
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.stage = None  # Free-form description of the current step
+        self.progress = 0.0  # Fraction complete, 0..1
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.cleanup = None  # Called once when the job ends, whether or not its work ever ran
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def update(self, progress=None, stage=None):
+        """
+        Report progress from the work function; raises JobCancelled if the job was cancelled.
+        """
+        if progress is not None:
+            self.progress = min(max(progress, 0.0), 1.0)
+        if stage is not None:
+            self.stage = stage
+        if self.cancelled:
+            raise JobCancelled()
+
+    def to_dict(self, include_result=True):
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 4),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if include_result and self.status == "done":
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    In-process background jobs on a bounded thread pool. Work functions receive their `Job`
+    and report progress through `job.update`, which is also where cancellation takes effect.
+    Finished jobs are forgotten `retention` seconds after they end.
+    """
+
+    def __init__(self, max_workers=2, max_pending=100, retention=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.max_pending = max_pending  # Queued jobs accepted beyond the running ones
+        self.retention = retention
+        self.jobs = {}  # Job ID -> Job
+        self.lock = threading.Lock()
+
+    def submit(self, work, *args, owner=None, cleanup=None, **kwargs):
+        """
+        Queue `work(job, *args, **kwargs)` and return its Job immediately. `cleanup()` runs once
+        the job is over, including when it is cancelled or shut down before it starts, so it
+        is the place to release what the job was handed (e.g. delete an uploaded file).
+        """
+        self.prune()
+        with self.lock:
+            pending = sum(1 for job in self.jobs.values() if job.status == "queued")
+            if pending >= self.max_pending:
+                raise JobQueueFull("Too many jobs are waiting; try again later.")
+            job = Job(owner)
+            job.cleanup = cleanup
+            self.jobs[job.id] = job
+        job.future = self.executor.submit(self._run, job, work, args, kwargs)
+        logging.info("Queued job %s.", job.id)
+        return job
+
+    def _run(self, job, work, args, kwargs):
+        if job.cancelled:
+            job.status, job.finished = "cancelled", time.time()
+            self._cleanup(job)
+            return
+        job.status, job.started = "running", time.time()
+        try:
+            job.result = work(job, *args, **kwargs)
+            job.progress, job.status = 1.0, "done"
+            logging.info("Job %s finished in %.1fs.", job.id, time.time() - job.started)
+        except JobCancelled:
+            job.status = "cancelled"
+            logging.info("Job %s cancelled.", job.id)
+        except Exception as e:
+            job.status, job.error = "failed", str(e) if isinstance(e, ValueError) else "An unexpected error occurred."
+            logging.error("Job %s failed: %s", job.id, e, exc_info=True)
+        finally:
+            job.finished = time.time()
+            self._cleanup(job)
+
+    @staticmethod
+    def _cleanup(job):
+        cleanup, job.cleanup = job.cleanup, None  # Only ever once
+        if cleanup is None:
+            return
+        try:
+            cleanup()
+        except Exception as e:
+            logging.error("Cleanup of job %s failed: %s", job.id, e, exc_info=True)
+
+    def get(self, job_id, owner=None):
+        """
+        Return a job by ID, or None if it does not exist or belongs to another owner.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or (job.owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def cancel(self, job_id, owner=None):
+        """
+        Cancel a queued job outright, or ask a running one to stop at its next progress update.
+        """
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status, job.finished = "cancelled", time.time()
+            self._cleanup(job)  # The job never started, so _run will not do it
+        return job
+
+    def prune(self):
+        cutoff = time.time() - self.retention
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff]:
+                del self.jobs[job_id]
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for job in list(self.jobs.values()):
+            if job.future is not None and job.future.cancelled():
+                job.status, job.finished = "cancelled", time.time()
+                self._cleanup(job)
@@ -0,0 +1,161 @@
+"""
+Pipelined processing of media that arrives as a stream.
+
+`Pipeline` runs a source and a chain of stages, each in its own thread, connected by bounded
+queues: every stage works on the first items while upstream stages are still producing the
+rest, and a slow stage makes the ones before it wait instead of buffering without limit. For
+URL inputs the chain is download -> `decode_stream` (ffmpeg) -> Whisper, so transcription can
+start on the first minutes of audio while the rest of the file is still downloading.
+"""
+import logging
+import queue
+import shutil
+import subprocess
+import threading
+import numpy as np
+
+SAMPLING_RATE = 16000  # Whisper's input rate
+_DONE = object()  # Queue sentinel: the upstream stage finished
+
+
+class _Failure:
+    """
+    Queue item carrying an upstream stage's exception to the stages after it.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def decode_stream(chunks, sampling_rate=SAMPLING_RATE, block_seconds=10):
+    """
+    Decode an audio or video byte stream with ffmpeg as the bytes arrive, yielding mono float32
+    blocks of `block_seconds`. Containers that keep their index at the end (non-"faststart"
+    MP4) can only be decoded once all bytes are in; ffmpeg then simply starts later.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ValueError("ffmpeg is required to decode streamed media.")
+    process = subprocess.Popen(
+        [ffmpeg, "-loglevel", "error", "-i", "pipe:0", "-vn", "-ac", "1", "-ar", str(sampling_rate),
+         "-f", "s16le", "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    errors = []
+
+    def feed():
+        # Runs in its own thread: writing to ffmpeg while reading its output from one thread could deadlock
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg exited or was killed; its exit status tells why
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="decode-feed", daemon=True)
+    feeder.start()
+    block_bytes = int(block_seconds * sampling_rate) * 2  # 16-bit samples
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            data = data[: len(data) - len(data) % 2]
+            yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        feeder.join()
+        if errors:
+            raise errors[0]  # The download failed; the decoded audio is incomplete
+        if process.wait() != 0:
+            message = process.stderr.read().decode(errors="replace").strip()[-500:]
+            raise ValueError(f"ffmpeg could not decode the stream: {message}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+class Pipeline:
+    """
+    Iterate over `source` passed through `stages`, each a callable taking an iterator and
+    returning an iterator, with the source and every stage in a thread of its own. `queue_sizes`
+    bounds the items waiting after the source and after each stage (one int for all, or one per
+    queue). An exception in any stage ends the pipeline and is raised to the consumer; closing
+    the iterator early stops every stage.
+    """
+
+    def __init__(self, source, *stages, queue_sizes=4, name="pipeline"):
+        self.source = source
+        self.stages = stages
+        if isinstance(queue_sizes, int):
+            queue_sizes = [queue_sizes] * (len(stages) + 1)
+        self.queue_sizes = list(queue_sizes)
+        self.name = name
+
+    def __iter__(self):
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=size) for size in self.queue_sizes]
+
+        def put(target, item):
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def drain(source_queue):
+            while not stop.is_set():
+                try:
+                    item = source_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+
+        def run(produce, target):
+            items = None
+            try:
+                items = iter(produce())
+                for item in items:
+                    if not put(target, item):
+                        break
+                else:
+                    put(target, _DONE)
+            except Exception as e:
+                put(target, _Failure(e))
+            finally:
+                if hasattr(items, "close"):
+                    items.close()  # Lets the stage release its resources (ffmpeg, models, connections)
+
+        producers = [lambda: self.source]
+        for index, stage in enumerate(self.stages):
+            producers.append(lambda stage=stage, index=index: stage(drain(queues[index])))
+        threads = [
+            threading.Thread(target=run, args=(produce, queues[index]), name=f"{self.name}-{index}", daemon=True)
+            for index, produce in enumerate(producers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            yield from drain(queues[-1])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+            logging.debug("Pipeline %s stopped.", self.name)
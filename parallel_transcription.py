@@ -0,0 +1,162 @@
+"""
+Parallel transcription of long recordings.
+
+The audio is decoded once, cut into chunks of roughly `chunk_seconds` at silences found by
+faster-whisper's Silero VAD, and the chunks are transcribed by a pool of worker processes
+that each hold their own WhisperModel. Segment timestamps are shifted back onto the
+recording's timeline; where no silence was close enough to a cut, neighbouring chunks
+overlap by `overlap_seconds` and each segment is kept only by the chunk that owns its midpoint.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from faster_whisper import WhisperModel, decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+SAMPLING_RATE = 16000  # Whisper's input rate
+
+_worker_model = None  # The WhisperModel of the current worker process
+
+
+def plan_chunks(audio, chunk_seconds=300, overlap_seconds=1.0, search_seconds=30, min_silence_ms=500):
+    """
+    Return chunks as (start, end, own_start, own_end) sample offsets. A chunk decodes
+    [start, end) but only keeps segments whose midpoint falls in [own_start, own_end).
+    Each cut is placed in the middle of the longest silence within `search_seconds` of the
+    target length; without one, the cut is made at the target with an overlap on both sides.
+    """
+    total = len(audio)
+    target = int(chunk_seconds * SAMPLING_RATE)
+    if total <= target * 1.5:
+        return [(0, total, 0, total)]
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=min_silence_ms))
+    gaps = [(speech[i]["end"], speech[i + 1]["start"]) for i in range(len(speech) - 1)]
+    if speech:
+        gaps = [(0, speech[0]["start"])] + gaps + [(speech[-1]["end"], total)]
+    window = int(search_seconds * SAMPLING_RATE)
+    overlap = int(overlap_seconds * SAMPLING_RATE)
+
+    cuts = []  # (cut point, overlap on each side)
+    position = 0
+    while total - position > target * 1.5:
+        goal = position + target
+        # Parts of silences inside the search window around the target
+        nearby = [
+            (max(start, goal - window), min(end, goal + window))
+            for start, end in gaps if start < goal + window and end > goal - window
+        ]
+        if nearby:
+            start, end = max(nearby, key=lambda gap: gap[1] - gap[0])
+            cut, margin = (start + end) // 2, 0  # Silence: nothing is spoken across the cut
+        else:
+            cut, margin = goal, overlap
+        cuts.append((cut, margin))
+        position = cut
+    chunks = []
+    own_start, margin_before = 0, 0
+    for cut, margin in cuts + [(total, 0)]:
+        chunks.append((max(0, own_start - margin_before), min(total, cut + margin), own_start, cut))
+        own_start, margin_before = cut, margin
+    return chunks
+
+
+def _init_worker(model_size_or_path, device, compute_type, options):
+    global _worker_model
+    _worker_model = WhisperModel(
+        model_size_or_path=model_size_or_path, device=device, compute_type=compute_type, **options
+    )
+
+
+def _transcribe_chunk(audio, start, own_start, own_end, beam_size):
+    """
+    Transcribe one chunk in a worker; returns its owned segments on the global timeline.
+    """
+    offset = start / SAMPLING_RATE
+    segments, _ = _worker_model.transcribe(audio, beam_size=beam_size)
+    kept = []
+    for segment in segments:
+        midpoint = offset + (segment.start + segment.end) / 2
+        if own_start / SAMPLING_RATE <= midpoint < own_end / SAMPLING_RATE:
+            kept.append({"text": segment.text, "start": offset + segment.start, "end": offset + segment.end})
+    return kept
+
+
+def _same_text(a, b):
+    return " ".join(a.lower().split()) == " ".join(b.lower().split())
+
+
+class ParallelTranscriber:
+    """
+    Owns a pool of `workers` processes, each loading the model once, and transcribes files
+    by chunks across them. CPU threads are split between workers so they do not oversubscribe cores.
+    """
+
+    def __init__(self, model_size_or_path="base", device="cpu", compute_type="int8", workers=None,
+                 chunk_seconds=300, overlap_seconds=1.0, beam_size=5, **options):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.beam_size = beam_size
+        options.setdefault("cpu_threads", max(1, (os.cpu_count() or 1) // self.workers))
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),  # Forking a threaded web server is unsafe
+            initializer=_init_worker,
+            initargs=(model_size_or_path, device, compute_type, options),
+        )
+
+    def iter_segments(self, path_or_audio):
+        """
+        Yield the segments of a file (or a 16 kHz float32 array) in order; later chunks are
+        transcribed in parallel while earlier ones are being consumed.
+        """
+        audio = decode_audio(path_or_audio) if isinstance(path_or_audio, str) else path_or_audio
+        chunks = plan_chunks(audio, self.chunk_seconds, self.overlap_seconds)
+        logging.info(
+            "Transcribing %.0fs of audio in %d chunks on %d workers.",
+            len(audio) / SAMPLING_RATE, len(chunks), self.workers,
+        )
+        futures = [
+            self.executor.submit(_transcribe_chunk, audio[start:end], start, own_start, own_end, self.beam_size)
+            for start, end, own_start, own_end in chunks
+        ]
+        previous = None
+        try:
+            for future in futures:
+                for segment in future.result():
+                    if previous is not None and segment["start"] < previous["end"] and _same_text(
+                        segment["text"], previous["text"]
+                    ):
+                        continue  # The same words decoded by both sides of an overlapping cut
+                    previous = segment
+                    yield segment
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def transcribe(self, path_or_audio):
+        return list(self.iter_segments(path_or_audio))
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+_transcribers = {}
+_transcribers_lock = threading.Lock()
+
+
+def get_parallel_transcriber(model_size_or_path="base", device="cpu", compute_type="int8", workers=None, **options):
+    """
+    Return the process-wide ParallelTranscriber for a configuration, so worker processes and
+    their models are started once rather than per file.
+    """
+    key = (model_size_or_path, device, compute_type, workers) + tuple(sorted(options.items()))
+    with _transcribers_lock:
+        transcriber = _transcribers.get(key)
+        if transcriber is None:
+            transcriber = _transcribers[key] = ParallelTranscriber(
+                model_size_or_path, device, compute_type, workers, **options
+            )
+        return transcriber
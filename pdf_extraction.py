@@ -0,0 +1,92 @@
+"""
+Page-level PDF text extraction for Transcribe.
+
+Large documents are split into page ranges that worker processes extract in parallel;
+pages are yielded in document order as soon as their range is done, so downstream
+chunking and embedding can start before the last page has been parsed.
+"""
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+
+PAGES_PER_TASK = 16  # Pages extracted per worker task
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_pages(path):
+    with open(path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_page_range(path, start, stop):
+    """
+    Return the texts of pages [start, stop). Each worker opens the file itself, as readers cannot be shared.
+    """
+    with open(path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+
+def iter_pages(path, workers=None, pages_per_task=PAGES_PER_TASK, total=None):
+    """
+    Yield (page number, text) pairs in order, from 1. With `workers`, page ranges are
+    extracted by that many processes; otherwise pages are read serially in this process.
+    `total` is the page count, if the caller already knows it.
+    """
+    total = total if total is not None else count_pages(path)
+    if not workers or workers < 2 or total <= pages_per_task:
+        with open(path, "rb") as file:
+            for number, page in enumerate(PyPDF2.PdfReader(file).pages, 1):
+                yield number, page.extract_text() or ""
+        return
+    logging.info("Extracting %d PDF pages with %d workers.", total, workers)
+    context = multiprocessing.get_context("spawn")  # Forking a threaded web server is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        starts = range(0, total, pages_per_task)
+        futures = [
+            executor.submit(extract_page_range, path, start, min(start + pages_per_task, total)) for start in starts
+        ]
+        try:
+            for start, future in zip(starts, futures):
+                for offset, text in enumerate(future.result()):
+                    yield start + offset + 1, text
+        finally:
+            for future in futures:
+                future.cancel()  # The consumer stopped early; skip ranges not started yet
+
+
+def split_text(text, max_chars):
+    """
+    Break text into pieces of at most `max_chars`: by line, then by sentence, then by hard cut.
+    """
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if not line:
+            continue
+        if len(line) <= max_chars:
+            yield line
+            continue
+        for sentence in SENTENCE_END.split(line):
+            for start in range(0, len(sentence), max_chars):
+                yield sentence[start: start + max_chars]
+
+
+def chunk_pages(pages, max_chars=1500):
+    """
+    Pack consecutive page text into segments of at most `max_chars` characters, yielding
+    {"text", "page"} dicts where "page" is the page the segment starts on.
+    """
+    buffer, length, first_page = [], 0, None
+    for number, text in pages:
+        for piece in split_text(text, max_chars):
+            if buffer and length + 1 + len(piece) > max_chars:
+                yield {"text": " ".join(buffer), "page": first_page}
+                buffer, length = [], 0
+            if not buffer:
+                first_page = number
+            buffer.append(piece)
+            length += len(piece) + (1 if length else 0)
+    if buffer:
+        yield {"text": " ".join(buffer), "page": first_page}
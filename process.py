@@ -1,11 +1,11 @@
 from flask import (
     Blueprint, request, jsonify, render_template, redirect, url_for,
-    session, flash, current_app
+    session, flash, current_app, Response, stream_with_context, g
 )
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import os
 import logging
-import requests
 import time
 import traceback
 import numpy as np
@@ -16,11 +16,29 @@ import gensim.downloader as api
 from sklearn.metrics.pairwise import cosine_similarity
 from moviepy.editor import VideoFileClip
 import tempfile
+import uuid
+import json
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 # Import custom modules
-from transcribe import Transcribe
+from transcribe import Transcribe, profile_settings
+from whisper_pool import model_registry
 from gpt_integration import GPTIntegration
 from EmbeddingStorage import EmbeddingStorage
+from ann_index import IVFIndex
+from bm25_index import BM25Index
+from embedding_cache import EmbeddingCache
+from transcript_cache import TranscriptCache, file_digest, transcript_key
+from segment_chunking import SegmentChunker, merge_segments
+from instrumentation import metrics
+from upload_stream import parse_upload
+from session_store import SessionStore
+from downloader import Downloader, DownloadError
+from media_pipeline import Pipeline, decode_stream, ffmpeg_available
+from jobs import JobManager, JobQueueFull
+from quantization import ProductQuantizer, ScalarQuantizer
 
 # Configure logging for debugging and tracking events within the application
 logging.basicConfig(
@@ -29,6 +47,8 @@ logging.basicConfig(
 
 # Constants
 TIMEOUT = 1800  # Timeout for session data (e.g., transcription) in seconds
+TRANSCRIPT_PAGE_SIZE = 100  # Segments per '/transcript' page (and shown on the upload page)
+MAX_TRANSCRIPT_PAGE_SIZE = 1000
 ALLOWED_EXTENSIONS = {"mp4", "mp3", "wav", "pdf", "docx"}  # Define file types allowed for upload
 
 # Utility function to check if a file's extension is allowed
@@ -36,6 +56,41 @@ def allowed_file(filename):
     """Check if the file's extension is among the allowed ones."""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def session_namespace():
+    """
+    Return this session's embedding namespace, creating a session ID on first use, so each
+    user's uploads are stored and searched separately.
+    """
+    if "session_id" not in session:
+        session["session_id"] = uuid.uuid4().hex
+    return session["session_id"]
+
+def upload_form():
+    """
+    The current request's (form, files), parsed once per request. Multipart bodies are streamed:
+    uploaded files are written straight into UPLOAD_FOLDER while being hashed and checked against
+    their extension, and MAX_CONTENT_LENGTH is enforced as the body arrives (see `upload_stream`).
+    """
+    if "upload_form" not in g:
+        if request.mimetype == "multipart/form-data":
+            with metrics.span("upload_receive") as span:
+                g.upload_form = parse_upload(
+                    request.environ, current_app.config["UPLOAD_FOLDER"], current_app.config.get("MAX_CONTENT_LENGTH"),
+                    max_form_parts=request.max_form_parts, max_form_memory_size=request.max_form_memory_size,
+                )
+                span.set(bytes=sum(file.stream.size for file in g.upload_form[1].values()))
+        else:
+            g.upload_form = request.form, request.files
+    return g.upload_form
+
+def discard_uploads(keep=None):
+    """
+    Delete the files streamed in by this request other than `keep`.
+    """
+    for file in upload_form()[1].values():
+        if file.stream.path != keep:
+            file.stream.discard()
+
 # Initialize Blueprint for this module
 bp = Blueprint("process", __name__)
 
@@ -46,9 +101,10 @@ def upload():
     Handles both GET (display page) and POST (process uploads) requests.
     """
 
-    if request.method == "GET":
+    session_store = current_app.session_store
+    if request.method == "GET" and "session_id" in session:
         # On GET, clear any previous transcription data from the session for a fresh start
-        session.pop("transcript_segments", None)
+        session_store.clear_transcript(session["session_id"])
 
     # Check and reset outdated transcription data
     if (
@@ -56,47 +112,70 @@ def upload():
         and time.time() - session["transcription_timestamp"] > TIMEOUT
     ):
         current_app.logger.info("Transcription data is outdated, resetting...")
-        session.pop("transcript_segments", None)
+        if "session_id" in session:
+            session_store.clear_transcript(session["session_id"])
         session["transcription_timestamp"] = time.time()
 
     if request.method == "POST":
         # Handle POST request for file upload
-        if "file" not in request.files:
+        try:
+            _, files = upload_form()  # The file is already on disk once this returns
+        except RequestEntityTooLarge:
+            flash("File is too large.")
+            return redirect(request.url)
+        except ValueError as e:
+            flash(str(e))  # Malformed upload or content that does not match the extension
+            return redirect(request.url)
+        if "file" not in files:
+            discard_uploads()
             flash("No file part")  # Flash message for missing file part
             return redirect(request.url)
-        file = request.files["file"]
+        file = files["file"]
         if file.filename == "":
+            discard_uploads()
             flash("No selected file")  # Flash message for no file selected
             return redirect(request.url)
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)  # Secure the file name
             file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-            file.save(file_path)  # Save the file
+            file.close()
+            os.replace(file.stream.path, file_path)  # A rename within UPLOAD_FOLDER, not a copy
+            discard_uploads(keep=file.stream.path)
             flash("File successfully uploaded and is being processed.")
             return redirect(url_for("upload"))
         else:
+            discard_uploads()
             flash("Invalid file type.")  # Flash message for invalid file type
             return redirect(request.url)
 
-    # For GET requests or initial page load, display any existing transcript data
-    transcript_segments = session.get("transcript_segments", [])
+    # For GET requests or initial page load, display the first page of any existing transcript;
+    # the rest is fetched from '/transcript'
+    transcript_segments, transcript_total = [], 0
+    conversation_history = []
+    if "session_id" in session:
+        transcript_segments, transcript_total = session_store.transcript_page(
+            session["session_id"], 0, TRANSCRIPT_PAGE_SIZE
+        )
+        conversation_history = session_store.conversation(session["session_id"])
     concatenated_transcript = " ".join(
         [segment["text"] for segment in transcript_segments]
     )
-    conversation_history = session.get("conversation", [])
 
     return render_template(
         "upload.html",
         transcript=concatenated_transcript,
+        transcript_total=transcript_total,
         conversation=conversation_history,
     )
 
 
-def download_from_url(url):
+def download_from_url(url, downloader=None):
     """
     Download content from a given URL with retry logic. It specifically handles YouTube URLs differently
     from direct video links, attempting to download the best available stream for YouTube videos.
-    Retries up to three times before giving up if errors occur.
+    Retries up to three times before giving up if errors occur. Direct links go through `downloader`
+    (the app's shared Downloader by default), which fetches byte ranges in parallel and resumes
+    interrupted requests instead of starting over.
     """
 
     retries = 3  # Number of attempts to try downloading the file
@@ -119,12 +198,14 @@ def download_from_url(url):
                     continue
             else:
                 # Handle non-YouTube URLs assumed to be direct video links
-                response = requests.get(url, stream=True)
-                response.raise_for_status()  # Check for HTTP request errors
                 filename = tempfile.mktemp(prefix="download_", suffix=".mp4")  # Create a temporary file
-                with open(filename, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)  # Write the content to file in chunks
+                try:
+                    (downloader or current_app.downloader).download(url, filename)
+                except DownloadError as e:
+                    # The downloader has already retried and resumed; another round would start from scratch
+                    logging.error(f"Failed to download URL: {e}")
+                    remove_media(filename)
+                    return None
 
             if filename and os.path.exists(filename):
                 # If the file is successfully downloaded and exists, return its path
@@ -139,99 +220,517 @@ def download_from_url(url):
     return None  # Return None if all attempts fail
 
 
+def receive_media():
+    """
+    Obtain the media to transcribe from the current request: download it from the 'videoUrl'
+    form field, or save the uploaded 'file'. Returns the local file path; raises ValueError.
+    """
+    form, files = upload_form()
+    file = files.get("file")  # Attempt to retrieve a file from the POST request
+    video_url = form.get("videoUrl")  # Check if a video URL is provided in the form data
+
+    if video_url:
+        # If a video URL is provided, log this and attempt to download the video
+        discard_uploads()
+        logging.info(f"Received video URL for transcription: {video_url}")
+        return fetch_media(video_url)
+
+    if file and allowed_file(file.filename):
+        # The upload was streamed to a unique file in UPLOAD_FOLDER and hashed while it arrived
+        file.close()
+        file_path = file.stream.path
+        discard_uploads(keep=file_path)
+        g.content_digest = file.stream.digest  # Saves re-reading the file for the transcript cache key
+        logging.info(f"File uploaded and saved: {file_path}")
+        return file_path
+
+    # If no valid input is provided, log an error and raise a ValueError
+    discard_uploads()
+    logging.error("Invalid file type or no file provided.")
+    raise ValueError("Invalid file type or no file provided.")
+
+
+def fetch_media(url):
+    """
+    Download the media at `url` to a temporary file and return its path; raises ValueError.
+    """
+    with metrics.span("download") as span:
+        file_path = download_from_url(url)  # Use the function to download video
+        if file_path:
+            span.set(bytes=os.path.getsize(file_path))
+    if not file_path:
+        # If the video cannot be downloaded, log and raise an error
+        logging.error("Failed to download video from provided URL.")
+        raise ValueError("Failed to download video from provided URL.")
+    logging.info(f"Video downloaded successfully: {file_path}")
+    return file_path
+
+
+def create_transcriber(file_path):
+    """
+    Build a Transcribe for `file_path` from the app configuration and the request's optional 'profile'.
+    """
+    # Initialize Transcribe with configurations such as model size and compute type
+    model_size_or_path = current_app.config.get("WHISPER_MODEL", "base")
+    device = current_app.config.get("WHISPER_DEVICE", "cpu")  # Using CPU; consider "cuda" for GPU if available
+    compute_type = current_app.config.get("WHISPER_COMPUTE_TYPE", "default")
+    # A named profile (e.g. "cpu-int8") overrides device and compute type. Clients may only pick
+    # one of WHISPER_ALLOWED_PROFILES, since every profile loads a model pool of its own
+    profile = current_app.config.get("WHISPER_PROFILE")
+    requested = upload_form()[0].get("profile")
+    if requested and requested != profile:
+        if requested not in current_app.config.get("WHISPER_ALLOWED_PROFILES", ()):
+            raise ValueError(f"Transcription profile '{requested}' is not allowed.")
+        profile = requested
+
+    return Transcribe(
+        file_path,
+        model_size_or_path=model_size_or_path,
+        device=device,
+        compute_type=compute_type,
+        profile=profile,
+        parallel_workers=current_app.config.get("TRANSCRIBE_WORKERS"),  # Chunk long media across processes
+        pdf_workers=current_app.config.get("PDF_WORKERS"),  # Extract PDF page ranges across processes
+        max_segment_chars=current_app.config.get("SEGMENT_MAX_CHARS"),  # Retrieval-sized PDF segments
+        content_digest=g.get("content_digest"),
+    )
+
+
+def transcript_cache_key(file_path, transcriber):
+    """
+    Key of this file's transcript in the transcript cache, or None when no cache is configured.
+    """
+    if current_app.transcript_cache is None:
+        return None
+    settings = dict(
+        transcriber.cache_settings(), embedding_model=current_app.embedding_storage.model, chunking=chunk_settings()
+    )
+    digest = transcriber.content_digest
+    if digest is None:  # Downloads are not hashed on the way in
+        with metrics.span("content_hash"):
+            digest = file_digest(file_path)
+    return transcript_key(digest, settings)
+
+
+def chunk_settings():
+    """
+    Token budget and overlap of the chunks segments are merged into before embedding. A
+    CHUNK_MAX_TOKENS of 0 embeds each non-empty segment on its own.
+    """
+    return {
+        "max_tokens": current_app.config.get("CHUNK_MAX_TOKENS", 256),
+        "overlap_tokens": current_app.config.get("CHUNK_OVERLAP_TOKENS", 32),
+    }
+
+
+def embedding_chunks(transcript_segments):
+    """
+    The chunks of `transcript_segments` that are embedded and stored for retrieval.
+    """
+    with metrics.span("chunk", segments=len(transcript_segments)):
+        chunks = list(merge_segments(transcript_segments, **chunk_settings()))
+    logging.info(f"Merged {len(transcript_segments)} segments into {len(chunks)} chunks for embedding.")
+    return chunks
+
+
+def remove_media(file_path):
+    """
+    Delete a temporary upload or download once it has been processed.
+    """
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+        logging.info("Temporary file deleted.")
+
+
+def process_media(file_path, transcriber, namespace, job=None):
+    """
+    Transcribe a received file (or take it from the transcript cache) and store its embeddings in
+    `namespace`. Progress is reported to `job`, whose cancellation stops the work between segments.
+    Returns the transcript segments.
+    """
+    # A re-upload of the same content with the same settings skips Whisper and the embeddings API
+    cache_key = transcript_cache_key(file_path, transcriber)
+    cached = current_app.transcript_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        transcript_segments, embeddings = cached
+        logging.info("Transcript served from cache.")
+    else:
+        transcript_segments, embeddings = [], None
+        segments = metrics.iter_span("transcribe", transcriber.transcribe_stream(), file_type=transcriber.file_type)
+        try:
+            for segment in segments:
+                transcript_segments.append(segment)
+                if job is not None:
+                    job.update(progress=transcriber.progress(segment), stage="transcribing")
+        finally:
+            segments.close()  # Releases the model promptly when a job is cancelled
+    logging.info(
+        f"Transcription completed with {len(transcript_segments)} segments"
+    )
+    if not transcript_segments:
+        return transcript_segments
+
+    if job is not None:
+        job.update(stage="embedding")
+    # Assuming embedding storage is initialized in the current_app
+    embedding_storage = current_app.embedding_storage
+    concurrency = current_app.config.get("EMBEDDING_CONCURRENCY", 1)
+    chunks = embedding_chunks(transcript_segments)  # The transcript keeps its segments; retrieval uses chunks
+    if embeddings is not None:
+        embedding_storage.store_embeddings(chunks, embeddings, namespace=namespace)
+    elif concurrency > 1:
+        # Keep several embedding batches in flight; /ask sees chunks as they land
+        embeddings = embedding_storage.store_transcription_concurrent(
+            chunks, concurrency=concurrency, namespace=namespace
+        )
+    else:
+        embeddings = embedding_storage.store_transcription(chunks, namespace=namespace)
+    keep_transcript(namespace, transcript_segments, embeddings, cache_key if cached is None else None)
+    return transcript_segments
+
+
+def keep_transcript(namespace, transcript_segments, embeddings, cache_key=None):
+    """
+    Record a finished transcript: in the transcript cache under `cache_key` (if given), in the
+    session store, and on disk when the embedding store is persisted.
+    """
+    if cache_key:
+        current_app.transcript_cache.put(cache_key, transcript_segments, embeddings)
+    current_app.session_store.set_transcript(namespace, transcript_segments)  # The namespace is the session ID
+    embedding_storage = current_app.embedding_storage
+    if embedding_storage.directory:
+        embedding_storage.save()  # Append the new segments to the shared on-disk store
+    logging.info("Embeddings for transcription segments have been generated and stored.")
+
+
+def pipelined_url():
+    """
+    The request's 'videoUrl' if it can be processed by `process_url`: a direct link (YouTube goes
+    through pytube), with PIPELINE_URLS enabled and ffmpeg installed. None otherwise.
+    """
+    url = upload_form()[0].get("videoUrl")
+    if not url or "youtube.com" in url or "youtu.be" in url:
+        return None
+    if not current_app.config.get("PIPELINE_URLS", True) or not ffmpeg_available():
+        return None
+    return url
+
+
+def process_url(url, transcriber, namespace, job=None):
+    """
+    Pipelined counterpart of downloading `url` and calling `process_media`. The download, the
+    ffmpeg decode and Whisper each run in a thread of their own, handing chunks on through bounded
+    queues, and chunks are embedded while transcription continues, so the whole takes about as
+    long as its slowest stage rather than the sum of them. Returns the transcript segments.
+    """
+    downloader = current_app.downloader
+    embedding_storage = current_app.embedding_storage
+    batch_size = current_app.config.get("STREAM_EMBEDDING_BATCH", 4)  # Chunks per ingestion batch
+    digest = hashlib.sha256()  # Hashed on the way through, for the transcript cache
+
+    def download():
+        logging.info(f"Received video URL for pipelined transcription: {url}")
+        for chunk in downloader.iter_content(url):
+            digest.update(chunk)
+            yield chunk
+
+    pipeline = Pipeline(
+        download(),
+        decode_stream,
+        transcriber.transcribe_audio_blocks,
+        queue_sizes=(16, 12, 64),  # MiB of download, 10 s blocks of audio, segments
+        name="url",
+    )
+    chunker = SegmentChunker(**chunk_settings())
+    executor = ThreadPoolExecutor(max_workers=1)  # Embeds batches in order while transcription continues
+    transcript_segments, futures, pending = [], [], []
+    segments = metrics.iter_span("transcribe", iter(pipeline), file_type=transcriber.file_type)
+    try:
+        for segment in segments:
+            transcript_segments.append(segment)
+            if job is not None:
+                job.update(stage="transcribing")
+            pending.extend(chunker.add(segment))
+            if len(pending) >= batch_size:
+                futures.append(executor.submit(embedding_storage.store_transcription, pending, namespace=namespace))
+                pending = []
+        pending.extend(chunker.flush())
+        if pending:
+            futures.append(executor.submit(embedding_storage.store_transcription, pending, namespace=namespace))
+        if job is not None:
+            job.update(stage="embedding")
+        embeddings = [vector for future in futures for vector in future.result()]
+    except DownloadError as e:
+        logging.error(f"Failed to download URL: {e}")
+        raise ValueError("Failed to download video from provided URL.") from e
+    finally:
+        segments.close()  # Stops the download and the decoder on failure or cancellation
+        executor.shutdown(wait=False, cancel_futures=True)
+    logging.info(f"Pipelined transcription completed with {len(transcript_segments)} segments")
+    if transcript_segments:
+        # The content is only known once it has all arrived, so the cache can be filled but not consulted
+        transcriber.content_digest = digest.hexdigest()
+        keep_transcript(namespace, transcript_segments, embeddings, transcript_cache_key(None, transcriber))
+    return transcript_segments
+
+
+def timings_requested():
+    """
+    Whether the response should carry per-stage timings: METRICS_IN_RESPONSE, or '?timings=1'.
+    Only possible while metrics are enabled.
+    """
+    return metrics.enabled and (
+        current_app.config.get("METRICS_IN_RESPONSE", False) or request.args.get("timings") in ("1", "true")
+    )
+
+
+def transcription_job(job, app, file_path, transcriber, namespace, timings=False, url=None, pipelined=False):
+    """
+    Background job body for '/transcribe': runs `process_media` in an app context, on `file_path`
+    or on `url` once the job has downloaded it; a `pipelined` URL goes through `process_url`
+    instead. An upload is deleted by the job's cleanup hook (see `transcribe_route`), a download
+    by the job itself.
+    """
+    with app.app_context(), metrics.trace() as trace:
+        if pipelined:
+            transcript_segments = process_url(url, transcriber, namespace, job)
+        elif url is not None:
+            job.update(stage="downloading")
+            file_path = transcriber.filepath = fetch_media(url)
+            try:
+                transcript_segments = process_media(file_path, transcriber, namespace, job)
+            finally:
+                remove_media(file_path)
+        else:
+            transcript_segments = process_media(file_path, transcriber, namespace, job)
+    if not transcript_segments:
+        raise ValueError("Transcription successful but no content extracted.")
+    # The segments themselves are in the session store, served page by page from '/transcript'
+    result = {"transcript_id": namespace, "segments": len(transcript_segments)}
+    if timings and trace is not None:
+        result["timings"] = trace.to_dict()
+    return result
+
+
 @bp.route("/transcribe", methods=["POST"])
 def transcribe_route():
     """
     Handle POST requests for transcription by accepting either a direct file upload or a video URL.
     After the file is obtained, it is transcribed, and results are processed to extract and store embeddings.
+
+    By default the work runs as a background job: the response (202) carries a job ID and the URL
+    to poll for progress. With TRANSCRIBE_IN_BACKGROUND disabled the request waits for the work to
+    finish. Either way the result is the transcript's ID and segment count, not its text, which is
+    served page by page from 'transcript_url'. With metrics enabled, '?timings=1' adds per-stage
+    timings to the result.
     """
 
     logging.info("Starting the transcription process.")
     response_data = {}
+    file_path = None  # Initialize file_path variable to store the path of the downloaded or uploaded file
 
-    try:
-        file = request.files.get("file")  # Attempt to retrieve a file from the POST request
-        video_url = request.form.get("videoUrl")  # Check if a video URL is provided in the form data
-        file_path = None  # Initialize file_path variable to store the path of the downloaded or uploaded file
-
-        if video_url:
-            # If a video URL is provided, log this and attempt to download the video
-            logging.info(f"Received video URL for transcription: {video_url}")
-            file_path = download_from_url(video_url)  # Use the function to download video
-            if not file_path:
-                # If the video cannot be downloaded, log and raise an error
-                logging.error("Failed to download video from provided URL.")
-                raise ValueError("Failed to download video from provided URL.")
-            logging.info(f"Video downloaded successfully: {file_path}")
-
-        elif file and allowed_file(file.filename):
-            # If a file is uploaded and is of allowed type, secure and save the file
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-            file.save(file_path)
-            logging.info(f"File uploaded and saved: {file_path}")
-
-        else:
-            # If no valid input is provided, log an error and raise a ValueError
-            logging.error("Invalid file type or no file provided.")
-            raise ValueError("Invalid file type or no file provided.")
-
-        if file_path:
-            # Proceed with transcription if a valid file path exists
-            # Initialize Transcribe with configurations such as model size and compute type
-            model_size_or_path = "base"
-            device = "cpu"  # Using CPU; consider "cuda" for GPU if available
-            compute_type = "default"
-
-            transcriber = Transcribe(
-                file_path,
-                model_size_or_path=model_size_or_path,
-                device=device,
-                compute_type=compute_type,
-            )
-            transcript_segments = transcriber.transcribe()
-            logging.info(
-                f"Transcription completed with {len(transcript_segments)} segments"
-            )
-
+    with metrics.trace() as trace:  # Per-stage timings of this request, when metrics are enabled
+        try:
+            background = current_app.config.get("TRANSCRIBE_IN_BACKGROUND", True)
+            url = upload_form()[0].get("videoUrl") or None
+            pipelined = pipelined_url() is not None
+            if url and (pipelined or background):
+                # Direct links are transcribed while they download rather than afterwards, and a
+                # job downloads other links itself, so this web worker never waits on a download
+                discard_uploads()
+                logging.info(f"Received video URL for transcription: {url}")
+                transcriber = create_transcriber("download.mp4")  # Treated like a downloaded MP4
+            else:
+                file_path = receive_media()
+                transcriber = create_transcriber(file_path)
+            namespace = session_namespace()
+
+            if background:
+                # Hand the work to a job so this web worker is free to serve /ask meanwhile
+                job = current_app.job_manager.submit(
+                    transcription_job, current_app._get_current_object(), file_path, transcriber, namespace,
+                    timings=timings_requested(), url=url, pipelined=pipelined, owner=namespace,
+                    cleanup=functools.partial(remove_media, file_path),  # Also if cancelled before it starts
+                )
+                file_path = None  # The job's cleanup deletes the file when it is over
+                response_data["job_id"] = job.id
+                response_data["status_url"] = url_for("process.job_status", job_id=job.id)
+                response_data["transcript_url"] = url_for("process.transcript")
+                return jsonify(response_data), 202
+
+            if pipelined:
+                transcript_segments = process_url(url, transcriber, namespace)
+            else:
+                transcript_segments = process_media(file_path, transcriber, namespace)
+            if trace is not None and timings_requested():
+                response_data["timings"] = trace.to_dict()
             if transcript_segments:
-                # If transcription produces segments, concatenate them and store in session
-                transcript_text = "\n".join([seg["text"] for seg in transcript_segments])
-                session["transcript_segments"] = transcript_segments
-                response_data["transcript"] = transcript_text
-                # Assuming embedding storage is initialized in the current_app
-                embedding_storage = current_app.embedding_storage
-                embedding_storage.store_transcription(transcript_segments)
-                logging.info("Embeddings for transcription segments have been generated and stored.")
-
+                # process_media kept the segments server-side; the response stays the same size however long they are
+                response_data["transcript_id"] = namespace
+                response_data["segments"] = len(transcript_segments)
+                response_data["transcript_url"] = url_for("process.transcript")
             else:
                 # Handle cases where transcription is technically successful but returns no content
                 logging.warning("Transcription successful but no content extracted.")
                 response_data["error"] = "Transcription successful but no content extracted."
 
-        else:
-            logging.error("No file path available for transcription.")
-            response_data["error"] = "No file path available for transcription."
+            return jsonify(response_data)
 
-        return jsonify(response_data)
+        except JobQueueFull as e:
+            logging.warning(f"Rejected transcription: {e}")
+            response_data["error"] = str(e)
+            return jsonify(response_data), 503
 
-    except ValueError as ve:
-        # Handle specific exceptions like ValueError separately for more precise error response
-        logging.error(f"Error during transcription process: {ve}")
-        response_data["error"] = str(ve)
-        return jsonify(response_data), 400
+        except RequestEntityTooLarge:
+            logging.warning("Rejected an upload above MAX_CONTENT_LENGTH.")
+            response_data["error"] = "File is too large."
+            return jsonify(response_data), 413
 
-    except Exception as e:
-        # Catch all other unexpected exceptions, log them, and return a server error
-        logging.error(f"Unexpected error during transcription: {e}", exc_info=True)
-        response_data["error"] = "An unexpected error occurred."
-        return jsonify(response_data), 500
+        except ValueError as ve:
+            # Handle specific exceptions like ValueError separately for more precise error response
+            logging.error(f"Error during transcription process: {ve}")
+            response_data["error"] = str(ve)
+            return jsonify(response_data), 400
 
-    finally:
-        # Ensure that any temporary file used during the process is cleaned up
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
-            logging.info("Temporary file deleted.")
+        except Exception as e:
+            # Catch all other unexpected exceptions, log them, and return a server error
+            logging.error(f"Unexpected error during transcription: {e}", exc_info=True)
+            response_data["error"] = "An unexpected error occurred."
+            return jsonify(response_data), 500
+
+        finally:
+            # Ensure that any temporary file used during the process is cleaned up
+            remove_media(file_path)
+
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Report a transcription job's status and progress, and its result once done. Only the
+    session that submitted a job can see it.
+    """
+    job = current_app.job_manager.get(job_id, owner=session.get("session_id"))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@bp.route("/transcript", methods=["GET"])
+def transcript():
+    """
+    Return one page of the session's transcript: 'limit' segments (default TRANSCRIPT_PAGE_SIZE)
+    from position 'offset', with the total segment count.
+    """
+    if "session_id" not in session:
+        return jsonify({"segments": [], "offset": 0, "total": 0})
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", TRANSCRIPT_PAGE_SIZE, type=int), 1), MAX_TRANSCRIPT_PAGE_SIZE)
+    segments, total = current_app.session_store.transcript_page(session["session_id"], offset, limit)
+    response_data = {"segments": segments, "offset": offset, "total": total}
+    if offset + len(segments) < total:
+        response_data["next_offset"] = offset + len(segments)
+    return jsonify(response_data)
+
+
+@bp.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """
+    Cancel a queued or running transcription job.
+    """
+    job = current_app.job_manager.cancel(job_id, owner=session.get("session_id"))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict(include_result=False))
+
+
+def stream_event(event, payload, sse):
+    """
+    Encode one streamed event as a Server-Sent Event or as a JSON line.
+    """
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"type": event, **payload}) + "\n"
+
+
+@bp.route("/transcribe/stream", methods=["POST"])
+def transcribe_stream_route():
+    """
+    Like '/transcribe', but streams each segment to the client as soon as it is decoded, as JSON
+    lines (default) or Server-Sent Events (when the client accepts text/event-stream). Segments are
+    merged into chunks (see `segment_chunking`) that are handed to embedding ingestion in small
+    batches while decoding continues, so '/ask' can use the start of a file before its end has been
+    transcribed. The stream ends with a 'done' or 'error' event.
+    """
+    logging.info("Starting a streaming transcription.")
+    file_path = None
+    try:
+        file_path = receive_media()
+        transcriber = create_transcriber(file_path)
+    except RequestEntityTooLarge:
+        logging.warning("Rejected an upload above MAX_CONTENT_LENGTH.")
+        return jsonify({"error": "File is too large."}), 413
+    except ValueError as ve:
+        logging.error(f"Error during transcription process: {ve}")
+        remove_media(file_path)
+        return jsonify({"error": str(ve)}), 400
+
+    embedding_storage = current_app.embedding_storage
+    transcript_cache = current_app.transcript_cache
+    session_store = current_app.session_store
+    namespace = session_namespace()  # Resolved now: the session cookie is sent before the body streams
+    batch_size = current_app.config.get("STREAM_EMBEDDING_BATCH", 4)  # Chunks per ingestion batch
+    chunker = SegmentChunker(**chunk_settings())
+    best = request.accept_mimetypes.best_match(["application/x-ndjson", "text/event-stream"])
+    sse = best == "text/event-stream"
+    cache_key = transcript_cache_key(file_path, transcriber)
+    cached = transcript_cache.get(cache_key) if cache_key else None
+    reuse_embeddings = cached is not None and cached[1] is not None
+
+    def generate():
+        if cached is not None:
+            segments = (segment for segment in cached[0])
+        else:
+            segments = transcriber.transcribe_stream()
+        executor = ThreadPoolExecutor(max_workers=1)  # Embeds batches in order while decoding continues
+        futures, pending, streamed = [], [], []
+        try:
+            for segment in segments:
+                streamed.append(segment)
+                yield stream_event("segment", segment, sse)
+                pending.extend(chunker.add(segment))
+                if len(pending) >= batch_size and not reuse_embeddings:
+                    futures.append(executor.submit(embedding_storage.store_transcription, pending, namespace=namespace))
+                    pending = []
+            if reuse_embeddings:
+                embedding_storage.store_embeddings(embedding_chunks(cached[0]), cached[1], namespace=namespace)
+            else:
+                pending.extend(chunker.flush())
+            if pending and not reuse_embeddings:
+                futures.append(executor.submit(embedding_storage.store_transcription, pending, namespace=namespace))
+            embeddings = [vector for future in futures for vector in future.result()]
+            if cache_key and not reuse_embeddings and streamed:
+                transcript_cache.put(cache_key, streamed, embeddings)
+            count = len(streamed)
+            if embedding_storage.directory:
+                embedding_storage.save()  # Append the new segments to the shared on-disk store
+            session_store.set_transcript(namespace, streamed)
+            logging.info(f"Streamed and stored {count} segments.")
+            yield stream_event("done", {"segments": count}, sse)
+        except Exception as e:
+            logging.error(f"Error during streaming transcription: {e}", exc_info=True)
+            message = str(e) if isinstance(e, ValueError) else "An unexpected error occurred."
+            yield stream_event("error", {"error": message}, sse)
+        finally:
+            # Also runs when the client disconnects: release the model and drop queued batches
+            segments.close()
+            executor.shutdown(wait=False, cancel_futures=True)
+            remove_media(file_path)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # Keep proxies from buffering the stream
+    )
 
 
 @bp.route("/ask", methods=["POST"])
@@ -240,6 +739,9 @@ def ask():
     Handle POST requests to the '/ask' endpoint by processing queries sent to a GPT model.
     This function retrieves the query, enriches it with context from the session's conversation history,
     sends it to the GPT model, and appends the model's response to the conversation history.
+
+    This view holds a worker thread for the whole query; under an ASGI server, `async_ask.AskApp`
+    answers '/ask' on the event loop instead.
     """
 
     logging.info("Received a request to '/ask' endpoint.")
@@ -254,28 +756,26 @@ def ask():
     else:
         logging.info("Query received: %s", query)
 
-    # Ensure conversation_history exists in the session to maintain context
-    if "conversation_history" not in session:
-        logging.debug("Initializing 'conversation_history' in session.")
-        session["conversation_history"] = []
+    # The conversation history is kept server-side, keyed by the session ID
+    session_id = session_namespace()
+    session_store = current_app.session_store
+    conversation_history = session_store.conversation(session_id)
 
     logging.debug(
         "Current conversation history before appending: %s",
-        session.get("conversation_history"),
+        conversation_history,
     )
 
     try:
         logging.debug("Attempting to enrich query context and send to GPT.")
         # Call the GPT integration's handle_query method to process the query
         response_text, metadata = gpt_integration.handle_query(
-            session["conversation_history"], query
+            conversation_history, query, namespace=session_id
         )
-        # Append the response to the conversation history
-        session["conversation_history"].append(
-            {"role": "assistant", "content": response_text}
+        # Append the exchange to the conversation history
+        session_store.append_messages(
+            session_id, [{"role": "user", "content": query}, {"role": "assistant", "content": response_text}]
         )
-        # Mark the session as modified to ensure changes are saved
-        session.modified = True
         logging.info("GPT response appended to conversation history.")
         return jsonify({"response": response_text})
     except Exception as e:
@@ -289,19 +789,114 @@ def reset_conversation():
     Reset the conversation history by clearing the session.
     This is useful for starting a new conversation without previous context.
     """
+    if "session_id" in session:
+        # Free the session's embeddings along with the rest of its state
+        current_app.embedding_storage.drop_namespace(session["session_id"])
+        current_app.session_store.clear(session["session_id"])
     session.clear()  # Clear all data in the session
     return jsonify({"success": True})
 
+@bp.route("/metrics", methods=["GET"])
+def metrics_route():
+    """
+    Per-stage pipeline totals in the Prometheus text format, when METRICS_ENABLED is set.
+    """
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
 def initialize_components(app_config):
     """
     Initialize components like embedding storage and GPT integration,
     and store them in the application context for global access.
     This function is typically called during app startup.
     """
-    embedding_storage = EmbeddingStorage()  # Initialize embedding storage
+    index_factory = None
+    if app_config.get("EMBEDDING_INDEX") == "ivf":
+        # Approximate search for large namespaces; nprobe trades recall for latency
+        def index_factory():
+            return IVFIndex(
+                n_lists=app_config.get("IVF_N_LISTS", 256),
+                nprobe=app_config.get("IVF_NPROBE", 8),
+            )
+    codec_factory = None
+    if app_config.get("EMBEDDING_CODEC") == "int8":
+        codec_factory = ScalarQuantizer
+    elif app_config.get("EMBEDDING_CODEC") == "pq":
+        def codec_factory():
+            return ProductQuantizer(subspaces=app_config.get("PQ_SUBSPACES", 96))
+    rerank = app_config.get("EMBEDDING_RERANK", 0)  # Re-score top_k * rerank candidates at full precision
+    # Keyword matching catches names, numbers and acronyms that embeddings blur; "auto" skips the
+    # query embedding call when keywords alone find a segment containing every query term. Opt-in:
+    # plain vector search stays the default, as in EmbeddingStorage
+    retrieval_mode = app_config.get("RETRIEVAL_MODE", "vector")
+    keyword_index_factory = BM25Index if retrieval_mode != "vector" else None
+
+    # Transcripts and conversations stay on the server; the session cookie only carries the session ID
+    # A file rather than memory by default, so every worker process sees the same sessions.
+    # Expired sessions take their embeddings with them, persisted namespace directories included
+    session_store_path = app_config.get("SESSION_STORE_PATH")
+    if session_store_path is None:
+        os.makedirs(current_app.instance_path, exist_ok=True)
+        session_store_path = os.path.join(current_app.instance_path, "sessions.sqlite3")
+    app = current_app._get_current_object()
+    current_app.session_store = SessionStore(
+        session_store_path, ttl=TIMEOUT,
+        on_expire=lambda session_id: app.embedding_storage.drop_namespace(session_id),
+    )
+
+    # Per-stage timings for '/metrics' and, on request, transcription responses
+    metrics.enabled = app_config.get("METRICS_ENABLED", False)
+
+    # One connection pool for all URL downloads; large files are fetched as parallel byte ranges
+    current_app.downloader = Downloader(workers=app_config.get("DOWNLOAD_WORKERS", 4))
+
+    # Long transcriptions run on a bounded pool of background threads, off the request workers
+    current_app.job_manager = JobManager(
+        max_workers=app_config.get("TRANSCRIBE_JOB_WORKERS", 2),
+        max_pending=app_config.get("TRANSCRIBE_MAX_PENDING_JOBS", 100),
+    )
+
+    # Re-uploads of the same file skip transcription and embedding altogether
+    transcript_cache_path = app_config.get("TRANSCRIPT_CACHE_PATH")
+    current_app.transcript_cache = TranscriptCache(
+        transcript_cache_path, max_bytes=app_config.get("TRANSCRIPT_CACHE_MAX_BYTES", 1 << 30)
+    ) if transcript_cache_path else None
+
+    # Skip API calls for text that was embedded before (re-uploads, repeated questions)
+    cache = EmbeddingCache(
+        max_entries=app_config.get("EMBEDDING_CACHE_SIZE", 10000),
+        path=app_config.get("EMBEDDING_CACHE_PATH"),
+    )
+    store_path = app_config.get("EMBEDDING_STORE_PATH")
+    if store_path:
+        # Reuse embeddings saved by earlier runs or other workers; nothing is re-embedded
+        embedding_storage = EmbeddingStorage.load(
+            store_path, index_factory=index_factory, codec_factory=codec_factory, rerank=rerank,
+            cache=cache, ttl=TIMEOUT, keyword_index_factory=keyword_index_factory, retrieval_mode=retrieval_mode,
+        )
+    else:
+        # Per-session namespaces expire together with the session data
+        embedding_storage = EmbeddingStorage(
+            index_factory=index_factory, codec_factory=codec_factory, rerank=rerank,
+            cache=cache, ttl=TIMEOUT, keyword_index_factory=keyword_index_factory, retrieval_mode=retrieval_mode,
+        )
     gpt_integration = GPTIntegration(
         embedding_storage=embedding_storage,
         engine_id=app_config.get("GPT_ENGINE_ID", "gpt-3.5-turbo"),  # Use GPT-3.5 by default, can be configured
     )
     current_app.gpt_integration = gpt_integration  # Store GPT integration in current_app for global access
+
+    # Load the transcription model once per process, up front, instead of on every /transcribe
+    model_registry.pool_size = app_config.get("WHISPER_POOL_SIZE", 1)  # Concurrent transcriptions per process
+    if app_config.get("WHISPER_WARMUP", True):
+        try:
+            if app_config.get("WHISPER_PROFILE"):
+                device, compute_type, options = profile_settings(app_config["WHISPER_PROFILE"])
+            else:
+                device = app_config.get("WHISPER_DEVICE", "cpu")
+                compute_type, options = app_config.get("WHISPER_COMPUTE_TYPE", "default"), {}
+            model_registry.warm_up(app_config.get("WHISPER_MODEL", "base"), device, compute_type, **options)
+        except Exception as e:
+            logging.error(f"Failed to warm up Whisper model: {e}")
     return embedding_storage, gpt_integration
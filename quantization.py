@@ -0,0 +1,155 @@
+import logging
+import numpy as np
+
+SCORE_CHUNK_ROWS = 65536  # Rows decoded per step when scoring, to bound temporary memory
+
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantisation: each dimension is mapped affinely from its trained
+    [min, max] range onto 256 levels, cutting a float32 vector to a quarter of its size.
+    """
+
+    def __init__(self):
+        self.low = None  # Per-dimension minimum seen in training
+        self.step = None  # Per-dimension width of one quantisation level
+
+    @property
+    def is_trained(self):
+        return self.low is not None
+
+    def code_shape(self, dimension):
+        return (dimension,), np.int8
+
+    def bytes_per_vector(self, dimension):
+        return dimension
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.low = vectors.min(axis=0)
+        self.step = np.maximum(vectors.max(axis=0) - self.low, 1e-12) / 255
+        logging.info("Trained int8 scalar quantizer on %d vectors.", len(vectors))
+
+    def encode(self, vectors):
+        levels = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.step)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return self.low + (codes.astype(np.float32) + 128) * self.step
+
+    def scores(self, query, codes):
+        """
+        Asymmetric inner products between a float query and encoded rows, computed without
+        decoding: q.x = q.low + 128 * sum(q * step) + codes @ (q * step).
+        """
+        weights = query * self.step
+        offset = float(query @ self.low + 128 * weights.sum())
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start: start + SCORE_CHUNK_ROWS]
+            out[start: start + len(chunk)] = chunk.astype(np.float32) @ weights + offset
+        return out
+
+
+class ProductQuantizer:
+    """
+    Product quantisation: the vector is split into `subspaces` equal slices, and each slice
+    is replaced by the index of its nearest of 256 k-means centroids, so a 1536-d float32
+    vector (6 KB) becomes `subspaces` bytes.
+    """
+
+    def __init__(self, subspaces=96, iterations=15, seed=0):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None  # (subspaces, 256, sub_dimension) float32
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def code_shape(self, dimension):
+        return (self.subspaces,), np.uint8
+
+    def bytes_per_vector(self, dimension):
+        return self.subspaces
+
+    def _split(self, vectors):
+        count, dimension = vectors.shape
+        if dimension % self.subspaces:
+            raise ValueError(f"Dimension {dimension} is not divisible into {self.subspaces} subspaces.")
+        return vectors.reshape(count, self.subspaces, dimension // self.subspaces)
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        # argmin ||x - c||^2 == argmin (||c||^2 - 2 x.c)
+        return np.argmin((centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T, axis=1)
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < 256:
+            raise ValueError("Product quantization needs at least 256 training vectors.")
+        rng = np.random.default_rng(self.seed)
+        parts = self._split(vectors)
+        centroids = []
+        for j in range(self.subspaces):
+            sub = np.ascontiguousarray(parts[:, j, :])
+            codebook = sub[rng.choice(len(sub), 256, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._nearest(sub, codebook)
+                sums = np.zeros_like(codebook)
+                np.add.at(sums, assignment, sub)
+                counts = np.bincount(assignment, minlength=256)
+                filled = counts > 0
+                codebook[filled] = sums[filled] / counts[filled, None]
+            centroids.append(codebook)
+        self.centroids = np.stack(centroids)
+        logging.info("Trained product quantizer (%d subspaces) on %d vectors.", self.subspaces, len(vectors))
+
+    def encode(self, vectors):
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(parts), self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = self._nearest(parts[:, j, :], self.centroids[j])
+        return codes
+
+    def decode(self, codes):
+        parts = self.centroids[np.arange(self.subspaces), codes]  # (rows, subspaces, sub_dimension)
+        return parts.reshape(len(codes), -1)
+
+    def scores(self, query, codes):
+        """
+        Asymmetric distance computation: build a (subspaces, 256) table of partial inner
+        products for the query once, then each row's score is a sum of table lookups.
+        """
+        table = np.einsum("jkd,jd->jk", self.centroids, query.reshape(self.subspaces, -1))
+        subspace_ids = np.arange(self.subspaces)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start: start + SCORE_CHUNK_ROWS]
+            out[start: start + len(chunk)] = table[subspace_ids, chunk].sum(axis=1)
+        return out
+
+
+class QuantizedMatrix:
+    """
+    Matrix-like view over encoded rows, offering the two operations search needs:
+    `matrix @ query` (asymmetric scores) and `matrix[positions]` (decoded rows).
+    """
+
+    def __init__(self, codec, codes):
+        self.codec = codec
+        self.codes = codes
+        self.shape = (len(codes), None)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __matmul__(self, query):
+        return self.codec.scores(query, self.codes)
+
+    def __getitem__(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.ndim == 0:
+            return self.codec.decode(self.codes[positions][None])[0]
+        return self.codec.decode(self.codes[positions])
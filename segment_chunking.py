@@ -0,0 +1,102 @@
+"""
+Merging of transcript segments into retrieval-sized chunks before embedding.
+
+Whisper emits segments of a few seconds and DOCX files one segment per paragraph, many of
+them empty. Embedding those one by one costs an API input and an index row each and gives
+the search little context to match. `SegmentChunker` joins adjacent segments into windows
+of at most `max_tokens` estimated tokens, repeats up to `overlap_tokens` of each window at
+the start of the next so a passage cut at a boundary is still found whole, drops empty
+text, and keeps the first "start"/"page" and last "end" of the segments it covers.
+"""
+from EmbeddingStorage import estimate_tokens
+
+
+class SegmentChunker:
+    """
+    Incremental chunker: `add` takes segments in order and returns the windows they complete,
+    `flush` returns the last, partial one. With `max_tokens` 0 or None, non-empty segments
+    pass through unchanged.
+    """
+
+    def __init__(self, max_tokens=256, overlap_tokens=32, count_tokens=estimate_tokens):
+        if max_tokens and overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens
+        self.pieces = []  # (segment, tokens) in the current window
+        self.tokens = 0
+        self.fresh = 0  # Pieces in the window that were not carried over from the previous one
+
+    def _split(self, segment):
+        """
+        Normalise a segment's whitespace and cut text longer than `max_tokens` into word runs
+        that fit; the runs share the segment's timestamps.
+        """
+        text = " ".join(segment.get("text", "").split())
+        if not text:
+            return []
+        if not self.max_tokens or self.count_tokens(text) <= self.max_tokens:
+            return [dict(segment, text=text)]
+        pieces, words = [], []
+        for word in text.split(" "):
+            if words and self.count_tokens(" ".join(words + [word])) > self.max_tokens:
+                pieces.append(dict(segment, text=" ".join(words)))
+                words = []
+            words.append(word)
+        pieces.append(dict(segment, text=" ".join(words)))
+        return pieces
+
+    def _emit(self):
+        pieces = [piece for piece, _ in self.pieces]
+        window = {"text": " ".join(piece["text"] for piece in pieces)}
+        timed = [piece for piece in pieces if "start" in piece]
+        if timed:
+            window["start"], window["end"] = timed[0]["start"], max(piece["end"] for piece in timed)
+        if "page" in pieces[0]:
+            window["page"] = pieces[0]["page"]
+        # Carry the tail of this window into the next one
+        carried, tokens = [], 0
+        for piece, count in reversed(self.pieces):
+            if tokens + count > self.overlap_tokens:
+                break
+            carried.insert(0, (piece, count))
+            tokens += count
+        self.pieces, self.tokens, self.fresh = carried, tokens, 0
+        return window
+
+    def add(self, segment):
+        """
+        Add one segment; returns the list of windows completed by it (often empty).
+        """
+        if not self.max_tokens:
+            return self._split(segment)
+        windows = []
+        for piece in self._split(segment):
+            count = self.count_tokens(piece["text"])
+            if self.fresh and self.tokens + count > self.max_tokens:
+                windows.append(self._emit())
+            while self.pieces and not self.fresh and self.tokens + count > self.max_tokens:
+                self.tokens -= self.pieces.pop(0)[1]  # Shrink the overlap to make room
+            self.pieces.append((piece, count))
+            self.tokens += count
+            self.fresh += 1
+        return windows
+
+    def flush(self):
+        """
+        Return the final window, if it holds anything new, and reset the chunker.
+        """
+        windows = [self._emit()] if self.fresh else []
+        self.pieces, self.tokens, self.fresh = [], 0, 0
+        return windows
+
+
+def merge_segments(segments, max_tokens=256, overlap_tokens=32, count_tokens=estimate_tokens):
+    """
+    Yield the chunks of an iterable of segments; see `SegmentChunker`.
+    """
+    chunker = SegmentChunker(max_tokens, overlap_tokens, count_tokens)
+    for segment in segments:
+        yield from chunker.add(segment)
+    yield from chunker.flush()
@@ -0,0 +1,141 @@
+import logging
+import sqlite3
+import threading
+import time
+
+
+class SessionStore:
+    """
+    Server-side per-session state: transcript segments and conversation messages, keyed by
+    session ID, so the (cookie) session only has to carry the ID. Transcripts are read back a
+    page at a time, keeping requests and responses the same size however long the media was.
+
+    Rows live in a SQLite database (in memory by default; give a file `path` to share it
+    between worker processes). Sessions untouched for `ttl` seconds are deleted on the next write,
+    and `on_expire` (if given) is then called with each expired session ID, to free what other
+    components keep for the session.
+    """
+
+    def __init__(self, path=":memory:", ttl=None, on_expire=None):
+        self.path = path
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")  # Concurrent readers while a worker writes
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, updated REAL);
+            CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+            CREATE TABLE IF NOT EXISTS segments (
+                session_id TEXT, position INTEGER, text TEXT, start_time REAL, end_time REAL, page INTEGER,
+                PRIMARY KEY (session_id, position)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT, position INTEGER, role TEXT, content TEXT,
+                PRIMARY KEY (session_id, position)
+            ) WITHOUT ROWID;
+            """
+        )
+        self.db.commit()
+        logging.debug("SessionStore initialized (path=%s, ttl=%s).", path, ttl)
+
+    def _touch(self, session_id):
+        """
+        Mark the session as used and delete idle ones; returns the expired session IDs.
+        """
+        now = time.time()
+        self.db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (session_id, now))
+        if self.ttl is None:
+            return []
+        expired = self.db.execute("SELECT session_id FROM sessions WHERE updated < ?", (now - self.ttl,)).fetchall()
+        for table in ("segments", "messages", "sessions"):
+            self.db.executemany(f"DELETE FROM {table} WHERE session_id = ?", expired)
+        if expired:
+            logging.info("Expired %d idle sessions.", len(expired))
+        return [row[0] for row in expired]
+
+    def _expired(self, session_ids):
+        # Called outside the lock, so the callback may take its time or use the store
+        if self.on_expire is None:
+            return
+        for session_id in session_ids:
+            try:
+                self.on_expire(session_id)
+            except Exception as e:
+                logging.error("Failed to free expired session %s: %s", session_id, e)
+
+    def set_transcript(self, session_id, segments):
+        """
+        Replace the session's transcript with `segments` ({"text"} dicts with optional "start",
+        "end" and "page").
+        """
+        rows = [
+            (session_id, position, segment.get("text", ""), segment.get("start"), segment.get("end"),
+             segment.get("page"))
+            for position, segment in enumerate(segments)
+        ]
+        with self.lock:
+            self.db.execute("DELETE FROM segments WHERE session_id = ?", (session_id,))
+            self.db.executemany("INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?)", rows)
+            expired = self._touch(session_id)
+            self.db.commit()
+        self._expired(expired)
+
+    def transcript_page(self, session_id, offset=0, limit=100):
+        """
+        Return (segments, total): up to `limit` segments from position `offset`, and the
+        number of segments in the session's transcript.
+        """
+        with self.lock:
+            total = self.db.execute("SELECT COUNT(*) FROM segments WHERE session_id = ?", (session_id,)).fetchone()[0]
+            rows = self.db.execute(
+                "SELECT text, start_time, end_time, page FROM segments WHERE session_id = ? AND position >= ? "
+                "ORDER BY position LIMIT ?",
+                (session_id, offset, limit),
+            ).fetchall()
+        segments = []
+        for text, start, end, page in rows:
+            segment = {"text": text}
+            if start is not None:
+                segment["start"], segment["end"] = start, end
+            if page is not None:
+                segment["page"] = page
+            segments.append(segment)
+        return segments, total
+
+    def clear_transcript(self, session_id):
+        with self.lock:
+            self.db.execute("DELETE FROM segments WHERE session_id = ?", (session_id,))
+            self.db.commit()
+
+    def conversation(self, session_id):
+        """
+        The session's conversation as a list of {"role", "content"} messages, oldest first.
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY position", (session_id,)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append_messages(self, session_id, messages):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+            self.db.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?)",
+                [(session_id, count + i, message["role"], message["content"]) for i, message in enumerate(messages)],
+            )
+            expired = self._touch(session_id)
+            self.db.commit()
+        self._expired(expired)
+
+    def clear(self, session_id):
+        """
+        Delete everything stored for a session.
+        """
+        with self.lock:
+            for table in ("segments", "messages", "sessions"):
+                self.db.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+            self.db.commit()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # The modules live at the repo root
+os.environ.setdefault("OPENAI_API_KEY", "test")  # EmbeddingStorage refuses to start without one
@@ -0,0 +1,131 @@
+"""
+Downloader against a local threaded HTTP server that serves byte ranges and can drop
+connections halfway through a response.
+"""
+import http.server
+import os
+import re
+import threading
+import pytest
+
+from downloader import Downloader
+
+DATA = os.urandom(4 << 20)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DATA)))
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        header = self.headers.get("Range", "")
+        with self.server.lock:
+            self.server.range_headers.append(header)
+        match = re.match(r"bytes=(\d+)-(\d*)$", header) if self.server.ranges else None
+        start = int(match.group(1)) if match else 0
+        end = int(match.group(2)) if match and match.group(2) else len(DATA) - 1
+        body = DATA[start:end + 1]
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        with self.server.lock:
+            drop = self.server.drop_first and start not in self.server.dropped and len(body) > 1024 and (
+                self.server.drop_limit is None or len(self.server.dropped) < self.server.drop_limit
+            )
+            if drop:
+                self.server.dropped.add(start)
+        if drop:
+            # Send half the body, then close the connection mid-response
+            with self.server.lock:
+                self.server.sent.setdefault(start, []).append(body[:len(body) // 2])
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        with self.server.lock:
+            self.server.sent.setdefault(start, []).append(body)
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def range_server():
+    """
+    Yields a server factory: `start(ranges=True, drop_first=False, drop_limit=None)` returns
+    (server, url). With `drop_first`, the first response starting at any given offset is cut off
+    halfway, up to `drop_limit` responses in all.
+    The server records each GET's Range header, and the bodies it sent by start offset.
+    """
+    servers = []
+
+    def start(ranges=True, drop_first=False, drop_limit=None):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        server.daemon_threads = True
+        server.ranges, server.drop_first, server.drop_limit = ranges, drop_first, drop_limit
+        server.range_headers, server.sent, server.dropped, server.lock = [], {}, set(), threading.Lock()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/media.mp4"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def downloader(**kwargs):
+    options = dict(chunk_bytes=64 << 10, min_part_bytes=256 << 10, retry_backoff=0, timeout=(5, 5))
+    options.update(kwargs)
+    return Downloader(**options)
+
+
+def test_parallel_ranges(range_server, tmp_path):
+    server, url = range_server()
+    path = tmp_path / "media.mp4"
+    assert downloader(workers=4).download(url, str(path)) == len(DATA)
+    assert path.read_bytes() == DATA
+    assert len(server.range_headers) > 1 and all(header.startswith("bytes=") for header in server.range_headers)
+
+
+def test_parallel_ranges_resume_dropped_parts(range_server, tmp_path):
+    server, url = range_server(drop_first=True)
+    path = tmp_path / "media.mp4"
+    assert downloader(workers=4).download(url, str(path)) == len(DATA)
+    assert path.read_bytes() == DATA
+    assert server.dropped  # Every part was cut off once and resumed from where it stopped
+
+
+def test_single_stream_resumes_with_range(range_server, tmp_path):
+    server, url = range_server(drop_first=True, drop_limit=1)
+    path = tmp_path / "media.mp4"
+    assert downloader(workers=1).download(url, str(path)) == len(DATA)
+    assert path.read_bytes() == DATA
+    # The first response is cut off halfway; the resume asks for exactly the missing suffix
+    half = len(DATA) // 2
+    assert server.range_headers == [f"bytes=0-{len(DATA) - 1}", f"bytes={half}-{len(DATA) - 1}"]
+    assert server.sent == {0: [DATA[:half]], half: [DATA[half:]]}
+
+
+def test_without_ranges_restarts_from_scratch(range_server, tmp_path):
+    server, url = range_server(ranges=False, drop_first=True)
+    path = tmp_path / "media.mp4"
+    downloader(workers=4).download(url, str(path))
+    assert path.read_bytes() == DATA
+    assert len(server.range_headers) == 2
+
+
+def test_iter_content_resumes(range_server):
+    server, url = range_server(drop_first=True)
+    assert b"".join(downloader().iter_content(url)) == DATA
+    assert server.range_headers[1] == f"bytes={len(DATA) // 2}-"
@@ -0,0 +1,72 @@
+"""
+Ingestion against `fake_openai_server` with injected latency and failures.
+"""
+import asyncio
+import time
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from EmbeddingStorage import EmbeddingStorage
+from fake_openai_server import start_server
+
+
+@pytest.fixture
+def fake_api():
+    server, base_url = start_server(dimension=16, reject_on="POISON", fail_on="OUTAGE", latency=0.05)
+    yield server, base_url
+    server.shutdown()
+
+
+def segments_with_poison(count=255, position=100):
+    segments = [{"text": f"good segment {i}"} for i in range(count)]
+    segments.insert(position, {"text": "POISON pill"})
+    return segments
+
+
+def test_bad_input_only_drops_itself(fake_api):
+    server, base_url = fake_api
+    storage = EmbeddingStorage(client=OpenAI(api_key="test", base_url=base_url, max_retries=0), retry_backoff=0)
+    embeddings = storage.store_transcription(segments_with_poison(), namespace="sync")
+    assert storage.collection("sync").size == 255
+    assert embeddings[100] is None and all(vector is not None for vector in embeddings[:100] + embeddings[101:])
+
+
+def test_async_bad_input_only_drops_itself(fake_api):
+    server, base_url = fake_api
+
+    async def run():
+        async with AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0) as client:
+            storage = EmbeddingStorage(async_client=client, retry_backoff=0)
+            embeddings = await storage.store_transcription_async(segments_with_poison(), namespace="async")
+            return storage, embeddings
+
+    storage, embeddings = asyncio.run(run())
+    assert storage.collection("async").size == 255
+    assert sum(vector is None for vector in embeddings) == 1
+
+
+def test_transient_errors_back_off_instead_of_splitting(fake_api):
+    server, base_url = fake_api
+    storage = EmbeddingStorage(client=OpenAI(api_key="test", base_url=base_url, max_retries=0), retry_backoff=0.01)
+    segments = [{"text": f"OUTAGE segment {i}"} for i in range(256)]
+    embeddings = storage.store_transcription(segments, namespace="outage")
+    assert all(vector is None for vector in embeddings)
+    assert server.batch_sizes == [256] * (storage.max_retries + 1)  # Retried whole, never bisected
+
+
+def test_concurrent_batches_overlap_latency(fake_api):
+    server, base_url = fake_api
+    segments = [{"text": f"segment {i}"} for i in range(64)]
+
+    async def run(concurrency):
+        async with AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0) as client:
+            storage = EmbeddingStorage(async_client=client, max_batch_size=8)
+            start = time.perf_counter()
+            await storage.store_transcription_async(segments, concurrency=concurrency, namespace="timed")
+            return time.perf_counter() - start, storage.collection("timed").size
+
+    serial, serial_size = asyncio.run(run(1))
+    concurrent, concurrent_size = asyncio.run(run(8))
+    assert serial_size == concurrent_size == 64
+    assert server.batch_sizes.count(8) == 16  # 8 batches per run
+    assert concurrent < serial / 2  # Eight batches of ~50 ms each overlap instead of queueing
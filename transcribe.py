@@ -1,48 +1,118 @@
 import os
 import logging
 from moviepy.editor import VideoFileClip
-import PyPDF2
 import docx
 from pathlib import Path
 import tempfile
-from faster_whisper import WhisperModel  # Ensure this is correctly installed and imported based on your setup
+import numpy as np
+from faster_whisper import decode_audio
+from whisper_pool import model_registry
+from parallel_transcription import get_parallel_transcriber
+from pdf_extraction import chunk_pages, count_pages, iter_pages
+from instrumentation import metrics
 
 # Setup basic configuration for logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+# Named model settings selectable per app or per request. The CPU profiles use CTranslate2's
+# int8 kernels, which cut memory roughly 4x and usually run 2-4x faster than float32 on CPU;
+# "cpu-int8-float32" keeps int8 weights but computes activations in float32 for accuracy.
+TRANSCRIPTION_PROFILES = {
+    "default": {"device": "cuda", "compute_type": "default"},
+    "cpu-float32": {"device": "cpu", "compute_type": "float32"},
+    "cpu-int8": {
+        "device": "cpu", "compute_type": "int8", "cpu_threads": os.cpu_count() or 4, "num_workers": 1,
+    },
+    "cpu-int8-float32": {
+        "device": "cpu", "compute_type": "int8_float32", "cpu_threads": os.cpu_count() or 4, "num_workers": 1,
+    },
+    "cuda-float16": {"device": "cuda", "compute_type": "float16"},
+}
+
+
+def profile_settings(profile):
+    """
+    Split a named profile into (device, compute_type, further WhisperModel options).
+    """
+    if profile not in TRANSCRIPTION_PROFILES:
+        raise ValueError(f"Unknown transcription profile: {profile}")
+    options = dict(TRANSCRIPTION_PROFILES[profile])
+    return options.pop("device"), options.pop("compute_type"), options
+
 class Transcribe:
     """
     This class handles the transcription of various media types (audio, video, PDF, DOCX)
     into text using appropriate models and techniques for each format.
     """
 
-    def __init__(self, filepath, model_size_or_path="base", device="cuda", compute_type="default"):
+    def __init__(self, filepath, model_size_or_path="base", device="cuda", compute_type="default", registry=None,
+                 profile=None, parallel_workers=None, pdf_workers=None, max_segment_chars=None, content_digest=None):
         """
         Initialize the Transcribe object with the file path and settings for the transcription model.
+        Models are borrowed from `registry` (the process-wide `whisper_pool.model_registry` by default)
+        instead of being loaded for every file. A `profile` from TRANSCRIPTION_PROFILES overrides
+        `device` and `compute_type` and adds its CPU thread settings. With `parallel_workers`, long
+        audio is split at silences and transcribed by that many worker processes (see `parallel_transcription`).
+        `pdf_workers` extracts PDF page ranges in parallel processes, and `max_segment_chars` packs PDF
+        text into segments of at most that many characters instead of one segment per page.
+        `content_digest` is the file's SHA-256, when it was computed while the file was received.
         """
         self.filepath = filepath
         self.model_size_or_path = model_size_or_path
+        self.model_options = {}  # Further WhisperModel arguments, e.g. cpu_threads and num_workers
+        if profile is not None:
+            device, compute_type, self.model_options = profile_settings(profile)
         self.device = device
         self.compute_type = compute_type
+        self.registry = registry or model_registry
+        self.parallel_workers = parallel_workers
+        self.pdf_workers = pdf_workers
+        self.max_segment_chars = max_segment_chars
+        self.content_digest = content_digest
+        self.duration = None  # Seconds of media, known once decoding starts
+        self.page_count = None  # Pages of a PDF, known once extraction starts
+        self.model_pool = None
         self.file_type = self.determine_file_type()  # Determine the type of the file based on its extension
         self.initialize_model()  # Initialize the transcription model based on the file type
 
     def initialize_model(self):
         """
-        Initialize the Whisper model for audio and video files.
+        Look up the shared Whisper model pool for audio and video files. The model itself is
+        loaded on first use (or at app start, see `WhisperModelRegistry.warm_up`).
         """
-        try:
-            if self.file_type in ["audio", "video"]:
-                self.whisper_model = WhisperModel(
-                    model_size_or_path=self.model_size_or_path, device=self.device
-                )
-                logging.info("Whisper model initialized successfully.")
-            else:
-                logging.info(f"No Whisper model required for file type: {self.file_type}")
-        except Exception as e:
-            logging.error(f"Failed to initialize Whisper model: {e}")
+        if self.file_type in ["audio", "video"]:
+            self.model_pool = self.registry.pool(
+                self.model_size_or_path, self.device, self.compute_type, **self.model_options
+            )
+            logging.info("Whisper model pool selected successfully.")
+        else:
+            logging.info(f"No Whisper model required for file type: {self.file_type}")
+
+    def progress(self, segment):
+        """
+        Fraction of the file covered up to and including `segment`, or None if unknown.
+        """
+        if "end" in segment and self.duration:
+            return segment["end"] / self.duration
+        if "page" in segment and self.page_count:
+            return segment["page"] / self.page_count
+        return None
+
+    def cache_settings(self):
+        """
+        Every setting that affects the segments this transcriber produces, for transcript cache keys.
+        """
+        return {
+            "file_type": self.file_type,
+            "model": self.model_size_or_path,
+            "device": self.device,
+            "compute_type": self.compute_type,
+            "model_options": self.model_options,
+            "parallel": bool(self.parallel_workers),  # Chunk boundaries can change the decoded text
+            "max_segment_chars": self.max_segment_chars,
+        }
 
     def determine_file_type(self):
         """
@@ -62,7 +132,7 @@ class Transcribe:
         Main method to route the transcription process based on the file type.
         """
         if self.file_type in ["audio", "video"]:
-            if not self.whisper_model:
+            if not self.model_pool:
                 logging.error("Whisper model not initialized properly.")
                 return None
             return self.transcribe_media()
@@ -74,41 +144,146 @@ class Transcribe:
             logging.error(f"Unsupported file type for transcription: {self.file_type}")
             return None
 
-    def transcribe_media(self):
+    def transcribe_stream(self):
         """
-        Transcribe audio or video files using the Whisper model.
+        Generator counterpart of `transcribe`: yields segment dicts as they become available,
+        so callers can forward them before the whole file is done. Errors are raised.
+        """
+        if self.file_type in ["audio", "video"]:
+            if not self.model_pool:
+                raise ValueError("Whisper model not initialized properly.")
+            yield from self.iter_media_segments()
+        elif self.file_type == "pdf":
+            yield from self.iter_pdf_segments()
+        elif self.file_type == "docx":
+            yield from self.transcribe_docx()
+        else:
+            raise ValueError(f"Unsupported file type for transcription: {self.file_type}")
+
+    def iter_media_segments(self):
+        """
+        Yield segments of an audio or video file as faster-whisper decodes them. A pooled
+        model is held until the generator is exhausted or closed.
         """
         logging.info(f"Starting transcription for {self.filepath}")
-        if self.file_type == "video":
-            logging.info(f"Extracting audio from video: {self.filepath}")
-            audio_file_path = self.extract_audio_from_video()
-            if not audio_file_path:
-                logging.error("Failed to extract audio from video.")
-                return None
-            self.filepath = audio_file_path  # Update the filepath to the extracted audio for transcription
-            logging.info(f"Audio extracted successfully: {audio_file_path}")
+        audio = self.filepath  # Audio files are decoded by faster-whisper itself
+        extracted_path = None
+        if self.file_type == "video" or self.parallel_workers:
+            # Decode up front: video needs its track pulled out, and parallel chunking needs the samples
+            try:
+                audio = self.load_audio()
+                self.duration = len(audio) / 16000
+                logging.info(f"Decoded {self.duration:.0f}s of audio in memory.")
+            except Exception as e:
+                if self.file_type != "video":
+                    raise
+                logging.warning(f"In-memory audio decode failed ({e}); extracting audio to a file instead.")
+                logging.info(f"Extracting audio from video: {self.filepath}")
+                with metrics.span("extract_audio_from_video") as span:
+                    extracted_path = self.extract_audio_from_video()
+                    if extracted_path:
+                        span.set(bytes=os.path.getsize(extracted_path))
+                if not extracted_path:
+                    raise ValueError("Failed to extract audio from video.")
+                audio = extracted_path
+                logging.info(f"Audio extracted successfully: {extracted_path}")
 
         logging.info(f"Transcribing {self.file_type} file: {self.filepath}")
         try:
-            segments, info = self.whisper_model.transcribe(self.filepath, beam_size=5)
-            transcript_segments = [
-                {"text": segment.text, "start": segment.start, "end": segment.end}
-                for segment in segments
-            ]
-            logging.info(
-                f"Transcription completed with {len(transcript_segments)} segments"
-            )
-            logging.info(
-                f"Detected language: {info.language} with probability {info.language_probability}"
-            )
-            return transcript_segments
+            if self.parallel_workers:
+                # Workers split the cores between them, so the profile's all-core thread count does not apply
+                options = {key: value for key, value in self.model_options.items() if key != "cpu_threads"}
+                transcriber = get_parallel_transcriber(
+                    self.model_size_or_path, self.device, self.compute_type, self.parallel_workers, **options
+                )
+                yield from metrics.iter_span("whisper_decode", transcriber.iter_segments(audio))
+                return
+            count = 0
+            with self.model_pool.acquire() as whisper_model:
+                # Segments are decoded lazily, one window at a time, as this loop advances
+                with metrics.span("language_detection"):
+                    segments, info = whisper_model.transcribe(audio, beam_size=5)
+                self.duration = info.duration
+                logging.info(
+                    f"Detected language: {info.language} with probability {info.language_probability}"
+                )
+                for segment in metrics.iter_span("whisper_decode", segments, audio_seconds=info.duration):
+                    count += 1
+                    yield {"text": segment.text, "start": segment.start, "end": segment.end}
+            logging.info(f"Transcription completed with {count} segments")
+        finally:
+            if extracted_path and os.path.exists(extracted_path):
+                os.remove(extracted_path)
+
+    def transcribe_audio_blocks(self, blocks, window_seconds=60, margin_seconds=2):
+        """
+        Yield segments for audio that arrives as 16 kHz float32 blocks (e.g. from `media_pipeline`),
+        so transcription starts before the recording is complete. Audio is transcribed in windows
+        of at least `window_seconds` of new audio; segments ending within `margin_seconds` of a
+        window's end may have been cut off, so their audio is carried into the next window instead.
+        """
+        sampling_rate = 16000
+        blocks = iter(blocks)
+        buffer = np.zeros(0, dtype=np.float32)
+        offset = 0.0  # Position of the buffer's start in the recording, in seconds
+        language = None  # Detected on the first window and kept for the rest
+        final = False
+        while not final:
+            target = len(buffer) + int(window_seconds * sampling_rate)
+            parts = [buffer]
+            while sum(len(part) for part in parts) < target:
+                block = next(blocks, None)
+                if block is None:
+                    final = True
+                    break
+                parts.append(block)
+            buffer = np.concatenate(parts)
+            if not len(buffer):
+                break
+            with self.model_pool.acquire() as whisper_model:
+                with metrics.span("whisper_decode", audio_seconds=len(buffer) / sampling_rate):
+                    segments, info = whisper_model.transcribe(buffer, beam_size=5, language=language)
+                    segments = list(segments)
+            language = info.language
+            length = len(buffer) / sampling_rate
+            if final:
+                keep, cut = segments, length
+            else:
+                keep = [segment for segment in segments if segment.end <= length - margin_seconds]
+                if keep:
+                    cut = keep[-1].end
+                else:
+                    cut = 0.0 if segments else max(length - margin_seconds, 0.0)  # Silence: keep only the tail
+            for segment in keep:
+                yield {"text": segment.text, "start": offset + segment.start, "end": offset + segment.end}
+            buffer = buffer[int(cut * sampling_rate):]
+            offset += cut
+        self.duration = offset + len(buffer) / sampling_rate
+
+    def transcribe_media(self):
+        """
+        Transcribe audio or video files using the Whisper model.
+        """
+        try:
+            return list(self.iter_media_segments())
         except Exception as e:
             logging.error(f"Error during {self.file_type} transcription: {e}")
             return None
 
+    def load_audio(self):
+        """
+        Decode the file's audio track straight into a 16 kHz mono float32 array with PyAV
+        (via faster-whisper), without an intermediate encode or temporary file.
+        """
+        with metrics.span("audio_decode") as span:
+            audio = decode_audio(self.filepath, sampling_rate=16000)
+            span.set(audio_seconds=len(audio) / 16000)
+        return audio
+
     def extract_audio_from_video(self):
         """
         Extract audio from a video file to a temporary location for transcription.
+        Fallback for containers PyAV cannot decode; `load_audio` avoids the MP3 round trip.
         """
         try:
             output_audio_path = tempfile.mktemp(suffix=".mp3")
@@ -119,20 +294,29 @@ class Transcribe:
             logging.error(f"Error extracting audio from video: {e}")
             return None
 
+    def iter_pdf_segments(self):
+        """
+        Yield PDF text in page order as it is extracted, so ingestion can start before the whole
+        document is parsed: one segment per page, or character-budgeted chunks with `max_segment_chars`.
+        """
+        self.page_count = count_pages(self.filepath)
+        pages = metrics.iter_span("pdf_extract", iter_pages(self.filepath, self.pdf_workers, total=self.page_count))
+        if self.max_segment_chars:
+            yield from chunk_pages(pages, self.max_segment_chars)
+        else:
+            for number, text in pages:
+                yield {"text": text, "page": number}
+
     def transcribe_pdf(self):
         """
         Extract text from PDF files using PyPDF2.
         """
         print(f"Extracting text from PDF: {self.filepath}")
-        text_content = []
         try:
-            with open(self.filepath, "rb") as file:
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    text_content.append(page.extract_text())
+            return list(self.iter_pdf_segments())
         except Exception as e:
             print(f"Error reading PDF file: {e}")
-        return [{"text": text} for text in text_content]
+            return []
 
     def transcribe_docx(self):
         """
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+
+HASH_CHUNK_BYTES = 1 << 20  # Read size while hashing uploads
+
+
+def file_digest(path, chunk_bytes=HASH_CHUNK_BYTES):
+    """
+    SHA-256 of a file's content, read in fixed-size chunks so large uploads are never held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def transcript_key(content_digest, settings):
+    """
+    Cache key for a transcript: the content hash plus every setting that changes the result
+    (model, compute type, chunking, embedding model, ...).
+    """
+    return hashlib.sha256(f"{content_digest}\0{json.dumps(settings, sort_keys=True)}".encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Content-addressed, on-disk cache of transcription results: the segments and their
+    embeddings, so a repeated upload skips both Whisper and the embeddings API.
+
+    Entries live in a SQLite database shared by worker processes. When the stored entries
+    exceed `max_bytes`, the least recently used ones are deleted.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes  # Budget for segment JSON plus embedding blobs
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")  # Concurrent readers while a worker writes
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, segments TEXT, vectors BLOB, "
+            "dimension INTEGER, size INTEGER, last_access REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS transcripts_last_access ON transcripts (last_access)")
+        self.db.commit()
+        logging.debug("TranscriptCache initialized (path=%s, max_bytes=%d).", path, max_bytes)
+
+    def get(self, key):
+        """
+        Return (segments, embeddings) for `key`, or None on a miss. `embeddings` is aligned with the
+        chunks that were embedded (see `segment_chunking`, which rebuilds them from `segments`) and
+        holds None for chunks that were not embedded; it is None if none were stored.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT segments, vectors, dimension FROM transcripts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE transcripts SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self.hits += 1
+        segments = json.loads(row[0])
+        embeddings = None
+        if row[1] is not None:
+            matrix = np.frombuffer(row[1], dtype=np.float32).reshape(-1, row[2])
+            embeddings = [None if np.isnan(vector[0]) else vector for vector in matrix]
+        return segments, embeddings
+
+    def put(self, key, segments, embeddings=None):
+        """
+        Store segments and (optionally) the embeddings of the chunks built from them, then evict
+        least recently used entries beyond the size budget.
+        """
+        blob, dimension = None, None
+        present = [vector for vector in embeddings or [] if vector is not None]
+        if present:
+            dimension = len(present[0])
+            matrix = np.full((len(embeddings), dimension), np.nan, dtype=np.float32)  # NaN rows mark missing vectors
+            for i, vector in enumerate(embeddings):
+                if vector is not None:
+                    matrix[i] = vector
+            blob = matrix.tobytes()
+        encoded = json.dumps(segments)
+        size = len(encoded.encode("utf-8")) + (len(blob) if blob else 0)
+        if size > self.max_bytes:
+            logging.info("Transcript of %d bytes exceeds the cache budget; not cached.", size)
+            return
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                (key, encoded, blob, dimension, size, time.time()),
+            )
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.db.execute("SELECT key, size FROM transcripts ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM transcripts WHERE key = ?", evicted)
+        logging.info("Evicted %d cached transcripts.", len(evicted))
+
+    def stats(self):
+        """
+        Hit/miss counters and stored size for monitoring.
+        """
+        with self.lock:
+            count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": count,
+                "bytes": size,
+            }
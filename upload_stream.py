@@ -0,0 +1,135 @@
+"""
+Streaming multipart uploads.
+
+Werkzeug's default parser spools every uploaded file to a temporary file, which
+`FileStorage.save` then copies to its destination. `parse_upload` instead hands the parser a
+stream factory that writes each file part straight into the upload folder as it arrives,
+hashing it, checking its leading bytes against its extension and enforcing a size cap on the
+way, so a mislabelled or oversized upload is rejected after its first chunk rather than after
+the whole body has been stored twice.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+
+SNIFF_BYTES = 16  # Leading bytes needed to recognise every supported format
+
+
+def sniff_type(head):
+    """
+    Return the extension matching a file's leading bytes ("mp4", "wav", "mp3", "pdf", "docx"), or None.
+    """
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "wav"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"  # ID3 tag or an MPEG audio frame header
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "docx"  # A ZIP container; python-docx validates the rest
+    return None
+
+
+SNIFFED_TYPES = {"mp4", "wav", "mp3", "pdf", "docx"}
+
+
+class UploadSink:
+    """
+    Writable stream for one uploaded file: data goes directly to a uniquely named file in
+    `directory` and through a SHA-256 hash. Reads, seeks and closes go to the file itself.
+    """
+
+    def __init__(self, directory, filename, max_bytes=None):
+        self.filename = secure_filename(filename or "")
+        self.extension = os.path.splitext(self.filename)[1].lower().lstrip(".")
+        self.max_bytes = max_bytes
+        self.file = tempfile.NamedTemporaryFile(
+            dir=directory, prefix="upload_", suffix=f".{self.extension}" if self.extension else "", delete=False
+        )
+        self.path = self.file.name
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.sniffed = None
+
+    @property
+    def digest(self):
+        """
+        SHA-256 hex digest of the content, the same value `transcript_cache.file_digest` computes.
+        """
+        return self.hash.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise RequestEntityTooLarge()  # Bodies without a Content-Length are only caught here
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._check_type()
+        self.hash.update(data)
+        return self.file.write(data)
+
+    def _check_type(self):
+        self.sniffed = sniff_type(self.head)
+        if self.extension not in SNIFFED_TYPES or self.sniffed == self.extension:
+            return
+        if self.sniffed is None and self.extension == "mp3":
+            return  # MPEG streams may start with padding before the first frame
+        raise ValueError(f"File content does not match its .{self.extension} extension.")
+
+    def finish(self):
+        """
+        Flush the file once the part is complete; short files are type-checked here.
+        """
+        if len(self.head) < SNIFF_BYTES:
+            self._check_type()
+        self.file.flush()
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def parse_upload(environ, directory, max_bytes=None, max_form_parts=1000, max_form_memory_size=500_000):
+    """
+    Parse a multipart request body, streaming file parts into `directory`. Returns (form, files)
+    like Werkzeug; each file's `stream` is its UploadSink, whose `path` is the stored file and
+    whose `digest` is the content hash. Raises RequestEntityTooLarge beyond `max_bytes`, for
+    more than `max_form_parts` parts or a text field above `max_form_memory_size` bytes (the
+    limits Flask's own form parsing applies; defaults as in Flask), and ValueError for malformed
+    bodies or mislabelled files, leaving no files behind.
+    """
+    sinks = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if max_form_parts is not None and len(sinks) >= max_form_parts:
+            raise RequestEntityTooLarge()  # Every file part is a file on disk; stop before creating more
+        sink = UploadSink(directory, filename, max_bytes)
+        sinks.append(sink)
+        return sink
+
+    try:
+        _, form, files = parse_form_data(
+            environ, stream_factory=stream_factory, max_content_length=max_bytes, silent=False,
+            max_form_parts=max_form_parts, max_form_memory_size=max_form_memory_size,
+        )
+        for sink in sinks:
+            sink.finish()
+    except Exception:
+        for sink in sinks:
+            sink.discard()
+        raise
+    for sink in sinks:
+        logging.info("Received %s (%d bytes, sha256 %s).", sink.filename, sink.size, sink.digest[:12])
+    return form, files
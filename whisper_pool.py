@@ -0,0 +1,112 @@
+import contextlib
+import logging
+import queue
+import threading
+import time
+from faster_whisper import WhisperModel
+
+
+class ModelPool:
+    """
+    Bounded pool of interchangeable model instances. Instances are created lazily by
+    `factory` up to `size`; when all are busy, `acquire` blocks until one is returned, so
+    concurrent requests share a fixed amount of model memory.
+    """
+
+    def __init__(self, factory, size=1):
+        self.factory = factory
+        self.size = size  # Maximum number of instances
+        self.idle = queue.LifoQueue()  # Most recently used first, so a warm instance is preferred
+        self.created = 0  # Instances created so far
+        self.lock = threading.Lock()
+
+    def _create(self):
+        start = time.perf_counter()
+        model = self.factory()
+        logging.info("Loaded model instance %d/%d in %.2fs.", self.created, self.size, time.perf_counter() - start)
+        return model
+
+    def warm_up(self, count=1):
+        """
+        Create up to `count` instances ahead of the first request.
+        """
+        while True:
+            with self.lock:
+                if self.created >= min(count, self.size):
+                    return
+                self.created += 1
+            try:
+                self.idle.put(self._create())
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+    @contextlib.contextmanager
+    def acquire(self, timeout=None):
+        """
+        Borrow an instance for the duration of the `with` block.
+        """
+        try:
+            model = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                try:
+                    model = self._create()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                try:
+                    model = self.idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError("No model instance became available in time.")
+        try:
+            yield model
+        finally:
+            self.idle.put(model)
+
+
+class WhisperModelRegistry:
+    """
+    Process-wide registry of WhisperModel pools keyed by (model size or path, device,
+    compute type, further options), so each configuration is loaded from disk once per
+    process rather than once per request.
+    """
+
+    def __init__(self, pool_size=1):
+        self.pool_size = pool_size  # Instances per configuration
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def pool(self, model_size_or_path="base", device="cpu", compute_type="default", **options):
+        """
+        Return the pool for a configuration, creating it (but not loading any model) on first use.
+        `options` are further WhisperModel arguments such as `cpu_threads` and `num_workers`.
+        """
+        key = (model_size_or_path, device, compute_type) + tuple(sorted(options.items()))
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                def factory():
+                    return WhisperModel(
+                        model_size_or_path=model_size_or_path, device=device, compute_type=compute_type, **options
+                    )
+
+                pool = self.pools[key] = ModelPool(factory, self.pool_size)
+                logging.debug("Created Whisper model pool for %s.", key)
+            return pool
+
+    def warm_up(self, model_size_or_path="base", device="cpu", compute_type="default", count=1, **options):
+        """
+        Load `count` instances of a configuration now, typically at application start.
+        """
+        self.pool(model_size_or_path, device, compute_type, **options).warm_up(count)
+
+
+model_registry = WhisperModelRegistry()